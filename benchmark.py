@@ -0,0 +1,491 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import preprocessing
+
+SAMPLE_WORDS = (
+    "the of and to a in is it that for you are this be on with as can have or not your by if "
+    "answer question model human because would there their which when people also about more "
+    "It's don't they've we're I'd you'll (see above) question, really? Yes! However, e.g. 50% \\n"
+).split()
+SAMPLE_UNICODE_WORDS = ["don’t", "café", "“quoted”", "—"]
+
+def synthetic_texts(n:int, words:int=200, seed:int=0) -> list:
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        tokens = rng.choices(SAMPLE_WORDS, k=rng.randint(words // 2, words * 2))
+        if rng.random() < 0.2:
+            tokens[rng.randrange(len(tokens))] = rng.choice(SAMPLE_UNICODE_WORDS)
+        texts.append(" ".join(tokens))
+    return texts
+
+def load_texts(path:str) -> list:
+    from dataset import Dataset
+    return Dataset.from_json(path).get_texts()
+
+def timeit(func, *args, repeat:int=3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_preprocessing(args):
+    texts = load_texts(args.dataset) if args.dataset else synthetic_texts(args.n)
+    n_chars = sum(len(text) for text in texts)
+    print(f'{len(texts)} texts, {n_chars / 1e6:.1f}M chars')
+
+    runs = {
+        'clean + lowercase': lambda: [preprocessing.lowercase(preprocessing.clean(text)) for text in texts],
+        'normalize': lambda: [preprocessing.normalize(text) for text in texts],
+        'normalize_many': lambda: preprocessing.normalize_many(texts),
+    }
+    baseline = None
+    for name, run in runs.items():
+        elapsed = timeit(run)
+        baseline = baseline or elapsed
+        print(f'{name:20s} {elapsed:8.3f}s {len(texts) / elapsed:12.0f} docs/sec  x{baseline / elapsed:.2f}')
+
+def has_odd_length(text:str) -> bool:
+    return len(text) % 2 == 1
+
+def bench_dataset(args):
+    from dataset import Dataset
+
+    texts = synthetic_texts(1000, words=20)
+    per_record = {}
+    for n in args.sizes:
+        data = [{'text': texts[i % len(texts)], 'label': i % 2} for i in range(n)]
+        dataset = Dataset(data, shuffle=False)
+        timings = {
+            'filter': timeit(lambda: Dataset(list(data), shuffle=False).filter(has_odd_length, args.workers), repeat=1),
+            'apply': timeit(lambda: Dataset(list(data), shuffle=False).apply(preprocessing.normalize, args.workers), repeat=1),
+            'map': timeit(lambda: dataset.map(preprocessing.normalize, args.workers), repeat=1),
+        }
+        per_record[n] = {name: elapsed / n * 1e6 for name, elapsed in timings.items()}
+        print(f'{n:>9} records  ' + '  '.join(f'{name} {us:.2f}us/record' for name, us in per_record[n].items()))
+
+    smallest, largest = per_record[min(args.sizes)], per_record[max(args.sizes)]
+    for name in smallest:
+        growth = largest[name] / smallest[name]
+        print(f'{name}: per-record cost x{growth:.2f} from {min(args.sizes)} to {max(args.sizes)} records')
+        if growth > args.max_growth:
+            raise SystemExit(f'{name} does not scale linearly')
+
+def bench_vocabulary(args):
+    import tempfile
+    import tensorflow as tf
+    from tensorflow.keras.layers import TextVectorization
+    import constants
+    from vocabulary import Vocabulary
+
+    texts = load_texts(args.dataset) if args.dataset else synthetic_texts(args.n)
+    texts = preprocessing.normalize_many(texts)
+
+    def adapt():
+        vectorizer = TextVectorization(max_tokens=None, output_mode="int", standardize=None)
+        vectorizer.adapt(tf.data.Dataset.from_tensor_slices(texts).batch(128))
+        return vectorizer.get_vocabulary()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        constants.CACHE_DIR = cache_dir
+        runs = {
+            'adapt': adapt,
+            'build': lambda: Vocabulary.build(texts, workers=args.workers, cache=False).tokens,
+            'build + save': lambda: Vocabulary.build(texts, workers=args.workers).tokens,
+            'build (cached)': lambda: Vocabulary.build(texts, workers=args.workers).tokens,
+        }
+        vocabularies = {}
+        for name, run in runs.items():
+            start = time.perf_counter()
+            vocabularies[name] = run()
+            print(f'{name:15s} {time.perf_counter() - start:8.3f}s  {len(vocabularies[name])} tokens')
+        assert vocabularies['build'] == vocabularies['adapt']
+
+def import_times(module:str) -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            _, cumulative_us, name = line.split('|')
+            cumulative.setdefault(name.strip(), int(cumulative_us))
+    return cumulative
+
+def bench_startup(args):
+    for module in args.modules:
+        cumulative = import_times(module)
+        total = cumulative[module] / 1e6
+        heavy = [name for name in args.forbid if name in cumulative]
+        top_level = sorted(((us, name) for name, us in cumulative.items() if '.' not in name and name != module), reverse=True)
+        print(f'import {module}: {total:.3f}s  heaviest: ' + ', '.join(f'{name} {us / 1e6:.3f}s' for us, name in top_level[:5]))
+        if heavy:
+            raise SystemExit(f'importing {module} loads {", ".join(heavy)}')
+        if total > args.max_seconds:
+            raise SystemExit(f'importing {module} takes {total:.3f}s, more than {args.max_seconds}s')
+
+def bench_pipeline(args):
+    from dataset import Dataset
+    from model import Model
+
+    model = Model.load(args.model)
+    dataset = Dataset.from_json(args.dataset)
+    Model._preprocess(dataset)
+    n_steps = -(-dataset.total() // args.batch_size)
+
+    def fit(keras_model, data):
+        epoch_times = []
+        for _ in range(args.epochs):
+            start = time.perf_counter()
+            keras_model.fit(data, epochs=1, verbose=0)
+            epoch_times.append(time.perf_counter() - start)
+        return epoch_times
+
+    runs = {'make_xy': fit(model.model, dataset.make_xy(args.batch_size))}
+    if model.classifier is not None:
+        pipeline = dataset.make_pipeline(args.batch_size, vectorizer=model.vectorizer, cache_path="", shuffle_buffer=64*args.batch_size)
+        runs['make_pipeline'] = fit(model.classifier, pipeline)
+
+    for name, epoch_times in runs.items():
+        steps_per_sec = ', '.join(f'{n_steps / elapsed:.1f}' for elapsed in epoch_times)
+        print(f'{name:15s} steps/sec per epoch: {steps_per_sec}')
+
+def adversarial_texts(n:int) -> dict:
+    header, footer = preprocessing._PAGE_HEADER, preprocessing._PAGE_FOOTER
+    return {
+        'header without footer': header + " answer" * (n // 7),
+        'header, footer mid-text': header + footer + " answer" * (n // 7),
+        'crlf runs': ("\r\n" * 50 + preprocessing._REGENERATE + "\r\n" * 50 + "Regenerat") * (n // 228),
+        'policy prefixes': (preprocessing._POLICY_PREFIX + "\r\n") * (n // 41),
+        'network error padding': "!" + ", " * (n // 2),
+    }
+
+def bench_artifacts(args):
+    for name, text in adversarial_texts(args.size).items():
+        small = text[:len(text) // 10]
+        per_char_small = timeit(preprocessing.scan_chatgpt_output, small) / len(small)
+        elapsed = timeit(preprocessing.scan_chatgpt_output, text)
+        growth = elapsed / len(text) / per_char_small
+        print(f'{name:25s} {len(text):>9} chars {elapsed*1e3:8.2f}ms  per-char cost x{growth:.2f} over a 10x longer input')
+        if elapsed > args.max_seconds or growth > args.max_growth:
+            raise SystemExit(f'scan_chatgpt_output is not linear on {name!r}')
+
+def bench_bucketing(args):
+    from tensorflow import keras
+    from dataset import Dataset
+    from model import Model
+
+    dataset = Dataset.from_json(args.dataset)
+    Model._preprocess(dataset)
+    test_data, train_data = dataset.split(0.2, shuffle=True)
+    texts = test_data.get_texts()
+
+    for bucketing in (False, True):
+        keras.utils.set_random_seed(args.seed)
+        model = Model.load(args.model)
+        model._reinitialize_model()
+        model.bucketing = bucketing
+        start = time.perf_counter()
+        model.train(train_data, args.batch_size, args.epochs)
+        train_time = time.perf_counter() - start
+        _, accuracy, _, _, fscore = model.test(test_data)
+        model.predict_batch(texts[:args.batch_size])
+        inference_time = timeit(lambda: model.predict_batch(texts), repeat=1)
+        name = 'bucketed' if bucketing else f'fixed {model.sequence_length}'
+        print(
+            f'{name:10s} train {train_data.total() * args.epochs / train_time:8.1f} docs/sec  '
+            f'predict {len(texts) / inference_time:8.1f} docs/sec  accuracy {accuracy*100:.2f}%  F1 {fscore*100:.2f}%'
+        )
+
+def bench_windows(args):
+    from model import Model
+
+    model = Model.load(args.model)
+    per_token = {}
+    for n_tokens in args.lengths:
+        documents = synthetic_texts(args.documents, words=n_tokens * 2 // 3, seed=n_tokens)
+        model.predict_long(documents[:1], args.batch_size)
+        windows_before, seconds_before = model.windows_scored, model.window_seconds
+        elapsed = timeit(lambda: model.predict_long(documents, args.batch_size, args.stride, args.aggregate), repeat=1)
+        windows = model.windows_scored - windows_before
+        rate = windows / (model.window_seconds - seconds_before)
+        n_total = sum(len(preprocessing.normalize(document).split()) for document in documents)
+        per_token[n_tokens] = elapsed / n_total
+        print(f'~{n_tokens:>7} tokens/doc  {windows:>7} windows  {rate:9.1f} windows/sec  {per_token[n_tokens]*1e6:.2f}us/token')
+
+    growth = per_token[max(args.lengths)] / per_token[min(args.lengths)]
+    print(f'per-token cost x{growth:.2f} from {min(args.lengths)} to {max(args.lengths)} tokens per document')
+    if growth > args.max_growth:
+        raise SystemExit('long-document scoring does not scale linearly')
+
+COLD_START_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+if {backend!r} == 'keras':
+    from model import Model
+    scorer = Model.load({path!r})
+else:
+    from inference import Scorer
+    scorer = Scorer.load({path!r}, {backend!r})
+scorer.predict_batch(["warm up"])
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def cold_start(backend:str, path:str) -> tuple:
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = COLD_START_SCRIPT.format(root=root, backend=backend, path=path)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    seconds, max_rss_kb = output.strip().splitlines()[-1].split()
+    return float(seconds), int(max_rss_kb) / 1024
+
+def bench_export(args):
+    texts = load_texts(args.dataset)[:args.n] if args.dataset else synthetic_texts(args.n)
+    runs = [('keras', args.model), ('savedmodel', args.export), ('tflite', args.export)]
+
+    for backend, path in runs:
+        startup, _ = cold_start(backend, path)
+
+        if backend == 'keras':
+            from model import Model
+            scorer = Model.load(path)
+        else:
+            from inference import Scorer
+            scorer = Scorer.load(path, backend)
+        scorer.predict_batch(texts[:1])
+        single = timeit(lambda: [scorer.predict_batch([text]) for text in texts], repeat=1) / len(texts)
+        batched = timeit(lambda: scorer.predict_batch(texts, args.batch_size), repeat=1) / len(texts)
+        print(f'{backend:10s} cold start {startup:6.2f}s  single-doc {single*1e3:7.2f}ms/doc  batched {batched*1e3:7.3f}ms/doc')
+
+def bench_quantization(args):
+    import tempfile
+    from dataset import Dataset
+    from inference import Scorer, accuracy_delta
+    from model import Model
+
+    model = Model.load(args.model)
+    dataset = Dataset.from_json(args.dataset)
+    Model._preprocess(dataset)
+    texts, labels = dataset.get_texts()[:args.n], dataset.get_labels()[:args.n]
+    reference = model.predict_batch(texts, args.batch_size)
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        for quantization in args.quantizations:
+            path = os.path.join(export_dir, quantization)
+            model.export(path, quantization=quantization, calibration=dataset)
+            size = os.path.getsize(os.path.join(path, 'classifier.tflite')) / 1024
+            startup, memory = cold_start('tflite', path)
+
+            scorer = Scorer.load(path, 'tflite')
+            scorer.predict_batch(texts[:1])
+            single = timeit(lambda: [scorer.predict_batch([text]) for text in texts[:200]], repeat=1) / len(texts[:200])
+            batched = timeit(lambda: scorer.predict_batch(texts, args.batch_size), repeat=1) / len(texts)
+            report = accuracy_delta(reference, scorer.predict_batch(texts, args.batch_size), labels)
+            print(
+                f"{quantization:8s} {size:9.1f}KiB  peak RSS {memory:7.1f}MiB  cold start {startup:5.2f}s  "
+                f"single-doc {single*1e3:6.2f}ms  batched {batched*1e3:6.3f}ms/doc  "
+                f"accuracy {report['accuracy']*100:.2f}% ({report['accuracy_delta']*100:+.2f})  agreement {report['agreement']*100:.2f}%  "
+                f"max |dp| {report['max_abs_difference']:.4f}"
+            )
+
+async def http_post(reader, writer, host:str, path:str, payload:dict):
+    body = json.dumps(payload).encode('utf8')
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+def bench_loadgen(args):
+    texts = synthetic_texts(1000)
+
+    async def client(worker:int, latencies:list, statuses:dict):
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        rng = random.Random(worker)
+        for _ in range(args.requests // args.concurrency):
+            if args.texts_per_request == 1:
+                payload = {'text': rng.choice(texts)}
+            else:
+                payload = {'texts': rng.choices(texts, k=args.texts_per_request)}
+            start = time.perf_counter()
+            status = await http_post(reader, writer, args.host, '/score', payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    async def run():
+        latencies, statuses = [], {}
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i, latencies, statuses) for i in range(args.concurrency)))
+        return latencies, statuses, time.perf_counter() - start
+
+    latencies, statuses, elapsed = asyncio.run(run())
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    n_texts = len(latencies) * args.texts_per_request
+    print(f'{len(latencies)} requests, concurrency {args.concurrency}, statuses {statuses}')
+    print(f'p50 {p50*1e3:.1f}ms  p99 {p99*1e3:.1f}ms  {len(latencies) / elapsed:.1f} req/sec  {n_texts / elapsed:.1f} docs/sec')
+
+def bench_evaluation(args):
+    import numpy as np
+    from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
+    from evaluation import StreamingEvaluator
+
+    rng = np.random.default_rng(args.seed)
+    labels = rng.integers(0, 2, args.n, dtype=np.uint8)
+    # probabilities at bin centres, so the binned metrics must match sklearn exactly at thresholds on bin edges
+    probabilities = ((np.floor(np.clip(rng.normal(0.35 + 0.3 * labels, 0.2), 0, 0.999) * 1000) + 0.5) / 1000).astype(np.float32)
+    thresholds = np.linspace(0, 1, args.thresholds)
+
+    def stream():
+        evaluator = StreamingEvaluator()
+        for start in range(0, args.n, args.batch_size):
+            evaluator.update(probabilities[start:start + args.batch_size], labels[start:start + args.batch_size])
+        return evaluator
+
+    evaluator = stream()
+    stream_time = timeit(stream, repeat=1)
+    sweep_time = timeit(lambda: [evaluator.scores(t) for t in thresholds] + [evaluator.roc_curve(), evaluator.pr_curve()])
+
+    def sklearn_scores(threshold):
+        predictions = (probabilities >= np.float32(threshold)).astype(np.uint8)
+        return (
+            confusion_matrix(labels, predictions, labels=[0, 1]),
+            accuracy_score(labels, predictions),
+            precision_score(labels, predictions, average='weighted', zero_division=0),
+            recall_score(labels, predictions, average='weighted', zero_division=0),
+            f1_score(labels, predictions, average='weighted', zero_division=0),
+        )
+
+    checked = thresholds[::max(len(thresholds) // 10, 1)]
+    start = time.perf_counter()
+    reference = [sklearn_scores(t) for t in checked]
+    sklearn_time = (time.perf_counter() - start) / len(checked)
+    difference = 0.0
+    for t, expected in zip(checked, reference):
+        actual = evaluator.scores(t)
+        if not (actual[0] == expected[0]).all():
+            raise SystemExit(f"confusion matrix differs from sklearn at threshold {t}: {actual[0].tolist()} != {expected[0].tolist()}")
+        difference = max(difference, *(abs(a - e) for a, e in zip(actual[1:], expected[1:])))
+    print(
+        f"stream {args.n / stream_time:12,.0f} predictions/sec  "
+        f"sweep of {len(thresholds)} thresholds + curves {sweep_time*1e3:7.2f}ms  "
+        f"sklearn {sklearn_time*1e3:8.2f}ms per threshold  max |diff| {difference:.2e}"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    preprocessing_parser = subparsers.add_parser('preprocessing', help="clean + lowercase against the fused normalizer")
+    preprocessing_parser.add_argument('--dataset', help="HC3-style JSONL file, synthetic texts when omitted")
+    preprocessing_parser.add_argument('-n', type=int, default=20000, help="number of synthetic texts")
+    preprocessing_parser.set_defaults(func=bench_preprocessing)
+
+    dataset_parser = subparsers.add_parser('dataset', help="check that Dataset filter/apply/map scale linearly")
+    dataset_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    dataset_parser.add_argument('--workers', type=int, default=1)
+    dataset_parser.add_argument('--max-growth', type=float, default=3.0, help="allowed growth of the per-record cost")
+    dataset_parser.set_defaults(func=bench_dataset)
+
+    artifacts_parser = subparsers.add_parser('artifacts', help="time scan_chatgpt_output on adversarial pages")
+    artifacts_parser.add_argument('--size', type=int, default=1000000, help="characters per adversarial text")
+    artifacts_parser.add_argument('--max-seconds', type=float, default=1.0)
+    artifacts_parser.add_argument('--max-growth', type=float, default=3.0, help="allowed growth of the per-character cost")
+    artifacts_parser.set_defaults(func=bench_artifacts)
+
+    vocabulary_parser = subparsers.add_parser('vocabulary', help="TextVectorization.adapt against the parallel vocabulary builder")
+    vocabulary_parser.add_argument('--dataset', help="HC3-style JSONL file, synthetic texts when omitted")
+    vocabulary_parser.add_argument('-n', type=int, default=50000, help="number of synthetic texts")
+    vocabulary_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    vocabulary_parser.set_defaults(func=bench_vocabulary)
+
+    startup_parser = subparsers.add_parser('startup', help="guard module import time with -X importtime")
+    startup_parser.add_argument('--modules', nargs='+', default=['main', 'cli', 'dataset'])
+    startup_parser.add_argument('--forbid', nargs='+', default=['tensorflow', 'keras', 'sklearn'], help="modules that must not load at import time")
+    startup_parser.add_argument('--max-seconds', type=float, default=1.5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help="training steps/sec with make_xy against the tf.data pipeline")
+    pipeline_parser.add_argument('model', help="saved model directory")
+    pipeline_parser.add_argument('dataset', help="HC3-style JSONL file")
+    pipeline_parser.add_argument('--batch-size', type=int, default=32)
+    pipeline_parser.add_argument('--epochs', type=int, default=3)
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    bucketing_parser = subparsers.add_parser('bucketing', help="throughput and accuracy of length-bucketed batches against fixed padding")
+    bucketing_parser.add_argument('model', help="saved model directory")
+    bucketing_parser.add_argument('dataset', help="HC3-style JSONL file")
+    bucketing_parser.add_argument('--batch-size', type=int, default=32)
+    bucketing_parser.add_argument('--epochs', type=int, default=2)
+    bucketing_parser.add_argument('--seed', type=int, default=0)
+    bucketing_parser.set_defaults(func=bench_bucketing)
+
+    windows_parser = subparsers.add_parser('windows', help="windows/sec of long-document scoring and its scaling with document length")
+    windows_parser.add_argument('model', help="saved model directory")
+    windows_parser.add_argument('--lengths', type=int, nargs='+', default=[200, 2000, 20000], help="approximate tokens per document")
+    windows_parser.add_argument('--documents', type=int, default=50)
+    windows_parser.add_argument('--batch-size', type=int, default=256)
+    windows_parser.add_argument('--stride', type=int)
+    windows_parser.add_argument('--aggregate', choices=['max', 'mean', 'weighted'], default='max')
+    windows_parser.add_argument('--max-growth', type=float, default=3.0, help="allowed growth of the per-token cost")
+    windows_parser.set_defaults(func=bench_windows)
+
+    export_parser = subparsers.add_parser('export', help="cold start and latency of the Keras model against exported artifacts")
+    export_parser.add_argument('model', help="saved model directory")
+    export_parser.add_argument('export', help="directory written by 'cli.py export'")
+    export_parser.add_argument('--dataset', help="HC3-style JSONL file, synthetic texts when omitted")
+    export_parser.add_argument('-n', type=int, default=500, help="number of documents")
+    export_parser.add_argument('--batch-size', type=int, default=256)
+    export_parser.set_defaults(func=bench_export)
+
+    quantization_parser = subparsers.add_parser('quantization', help="size, memory, latency and accuracy delta of quantized TFLite exports")
+    quantization_parser.add_argument('model', help="saved model directory")
+    quantization_parser.add_argument('dataset', help="HC3-style JSONL file, used for calibration and accuracy")
+    quantization_parser.add_argument('--quantizations', nargs='+', choices=['none', 'dynamic', 'float16', 'int8'], default=['none', 'dynamic', 'float16', 'int8'])
+    quantization_parser.add_argument('-n', type=int, default=2000, help="number of documents")
+    quantization_parser.add_argument('--batch-size', type=int, default=256)
+    quantization_parser.set_defaults(func=bench_quantization)
+
+    evaluation_parser = subparsers.add_parser('evaluation', help="streaming evaluator threshold sweeps against sklearn's scorers")
+    evaluation_parser.add_argument('-n', type=int, default=1000000, help="number of synthetic predictions")
+    evaluation_parser.add_argument('--batch-size', type=int, default=256)
+    evaluation_parser.add_argument('--thresholds', type=int, default=101)
+    evaluation_parser.add_argument('--seed', type=int, default=0)
+    evaluation_parser.set_defaults(func=bench_evaluation)
+
+    loadgen_parser = subparsers.add_parser('loadgen', help="load generator for 'cli.py serve': p50/p99 latency and throughput")
+    loadgen_parser.add_argument('--host', default='127.0.0.1')
+    loadgen_parser.add_argument('--port', type=int, default=8080)
+    loadgen_parser.add_argument('--requests', type=int, default=2000)
+    loadgen_parser.add_argument('--concurrency', type=int, default=32)
+    loadgen_parser.add_argument('--texts-per-request', type=int, default=1)
+    loadgen_parser.set_defaults(func=bench_loadgen)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+
+import preprocessing
+
+def text_hash(text:str, salt:str="") -> str:
+    digest = hashlib.blake2b(salt.encode('utf8'), digest_size=16)
+    digest.update(text.encode('utf8', 'surrogatepass'))
+    return digest.hexdigest()
+
+class LRUCache:
+    def __init__(self, max_entries:int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class DiskCache:
+    def __init__(self, path:str, table:str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.table = table
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value)')
+
+    def get_many(self, keys:list) -> dict:
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start+500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(f'SELECT key, value FROM {self.table} WHERE key IN ({placeholders})', chunk)
+                found.update(rows)
+        return found
+
+    def put_many(self, items:list):
+        with self.lock, self.connection:
+            self.connection.executemany(f'INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)', items)
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute(f'DELETE FROM {self.table}')
+
+    def close(self):
+        self.connection.close()
+
+class PreprocessCache:
+    def __init__(self, max_entries:int=100000, path:str=None):
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(path, 'preprocessed') if path else None
+        self.salt = f'pipeline-{preprocessing.PIPELINE_VERSION}:'
+
+    def normalize_many(self, texts:list) -> list:
+        keys = [text_hash(text, self.salt) for text in texts]
+        results = [self.memory.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        if missing and self.disk is not None:
+            stored = self.disk.get_many(list({keys[i] for i in missing}))
+            for i in missing:
+                if keys[i] in stored:
+                    results[i] = stored[keys[i]]
+                    self.memory.put(keys[i], results[i])
+            missing = [i for i in missing if results[i] is None]
+
+        if missing:
+            normalized = preprocessing.normalize_many([texts[i] for i in missing])
+            for i, text in zip(missing, normalized):
+                results[i] = text
+                self.memory.put(keys[i], text)
+            if self.disk is not None:
+                self.disk.put_many(list({keys[i]: results[i] for i in missing}.items()))
+
+        return results
+
+class PredictionCache:
+    def __init__(self, max_entries:int=100000, path:str=None):
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(path, 'predictions') if path else None
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, fingerprint:str):
+        if fingerprint != self.fingerprint:
+            self.memory.clear()
+            self.fingerprint = fingerprint
+
+    def keys(self, normalized_texts:list) -> list:
+        return [text_hash(text, self.fingerprint) for text in normalized_texts]
+
+    def get_many(self, keys:list) -> list:
+        results = [self.memory.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing and self.disk is not None:
+            stored = self.disk.get_many(list({keys[i] for i in missing}))
+            for i in missing:
+                if keys[i] in stored:
+                    results[i] = stored[keys[i]]
+                    self.memory.put(keys[i], results[i])
+
+        n_misses = sum(result is None for result in results)
+        self.misses += n_misses
+        self.hits += len(results) - n_misses
+        return results
+
+    def put_many(self, keys:list, probabilities:list):
+        items = dict(zip(keys, (float(p) for p in probabilities)))
+        for key, probability in items.items():
+            self.memory.put(key, probability)
+        if self.disk is not None:
+            self.disk.put_many(list(items.items()))
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.memory)}
@@ -0,0 +1,115 @@
+from datetime import datetime
+import json
+import os
+import sys
+import time
+import numpy as np
+from tensorflow import keras
+
+import constants
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PERCENTILES = [50, 90, 99]
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def log_path(name:str="train") -> str:
+    return os.path.join(constants.LOG_DIR, f'{name}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.jsonl')
+
+class TelemetryCallback(keras.callbacks.Callback):
+    # step timings are aggregated per epoch; records are throttled to one per `interval` seconds so the GUI is not flooded
+    def __init__(self, batch_size:int, path:str=None, on_record=None, interval:float=0.5, name:str=""):
+        super(TelemetryCallback, self).__init__()
+        self.batch_size = batch_size
+        self.name = name
+        self.path = path
+        self.on_record = on_record
+        self.interval = interval
+        self.log_file = None
+        self.epochs = None
+        self.epoch = 0
+
+    def on_train_begin(self, logs=None):
+        self.epochs = self.params.get('epochs')
+        self.train_start = time.perf_counter()
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.log_file = open(self.path, mode='a', encoding='utf8')
+        self._emit('train_begin', {'model': self.name, 'batch_size': self.batch_size})
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.step_times = []
+        self.epoch_start = time.perf_counter()
+        self.last_emit = self.epoch_start
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.batch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        self.step_times.append(now - self.batch_start)
+        if now - self.last_emit >= self.interval:
+            self.last_emit = now
+            self._emit('step', self._epoch_stats(batch + 1, now, logs))
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._emit('epoch', self._epoch_stats(len(self.step_times), time.perf_counter(), logs))
+
+    def on_train_end(self, logs=None):
+        self._emit('train_end', {'seconds': time.perf_counter() - self.train_start, **self._metrics(logs)})
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def _epoch_stats(self, steps:int, now:float, logs) -> dict:
+        elapsed = now - self.epoch_start
+        stats = {
+            'step': steps,
+            'steps': self.params.get('steps'),
+            'seconds': elapsed,
+            # the last batch of a bucket is usually smaller, so this is an upper bound
+            'examples_per_sec': steps * self.batch_size / elapsed if elapsed > 0 else 0.0,
+        }
+        if self.step_times:
+            step_ms = np.percentile(self.step_times, PERCENTILES) * 1e3
+            stats.update({f'step_ms_p{p}': float(ms) for p, ms in zip(PERCENTILES, step_ms)})
+            stats['step_ms_max'] = max(self.step_times) * 1e3
+        stats.update(self._metrics(logs))
+        return stats
+
+    @staticmethod
+    def _metrics(logs) -> dict:
+        return {name: float(value) for name, value in (logs or {}).items() if np.isscalar(value) or np.ndim(value) == 0}
+
+    def _emit(self, event:str, fields:dict):
+        record = {'event': event, 'time': time.time(), 'epoch': self.epoch + 1, 'epochs': self.epochs, **fields, 'peak_rss_mib': peak_rss_mib()}
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record) + '\n')
+            self.log_file.flush()
+        if self.on_record is not None:
+            self.on_record(record)
+
+def format_record(record:dict) -> str:
+    parts = [f"Epoch {record['epoch']}/{record['epochs']}"]
+    if record.get('step') is not None:
+        parts.append(f"step {record['step']}" + (f"/{record['steps']}" if record.get('steps') else ""))
+    for name in ('loss', 'acc', 'val_loss', 'val_acc'):
+        if name in record:
+            parts.append(f'{name} {record[name]:.4f}')
+    if 'examples_per_sec' in record:
+        parts.append(f"{record['examples_per_sec']:,.0f} ex/s")
+    if 'step_ms_p50' in record:
+        parts.append(f"step p50 {record['step_ms_p50']:.1f} ms, p99 {record['step_ms_p99']:.1f} ms")
+    if record.get('peak_rss_mib') is not None:
+        parts.append(f"peak RSS {record['peak_rss_mib']:,.0f} MiB")
+    return " · ".join(parts)
@@ -0,0 +1,294 @@
+import argparse
+import json
+import sys
+import time
+
+import constants
+
+def read_records(path:str, input_format:str, field:str):
+    if input_format == 'auto':
+        input_format = 'jsonl' if path.endswith(('.json', '.jsonl')) else 'text'
+
+    with (sys.stdin if path == '-' else open(path, mode='r', encoding='utf8')) as input_file:
+        for i, line in enumerate(input_file):
+            if input_format == 'jsonl':
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield record, record[field]
+            else:
+                text = line.rstrip('\n')
+                yield {'line': i}, text
+
+def positive_int(value:str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
+def batched(iterable, n:int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def score(args):
+    from cache import PredictionCache
+    from model import Model
+
+    cache = PredictionCache(path=args.cache) if args.cache else None
+    model = Model.load(args.model, cache)
+    records = read_records(args.input, args.format, args.field)
+
+    n_docs = 0
+    start = time.perf_counter()
+    last_report = start
+    with (sys.stdout if args.output == '-' else open(args.output, mode='w', encoding='utf8')) as output_file:
+        for batch in batched(records, args.batch_size):
+            texts = [text for _, text in batch]
+            if args.long:
+                probabilities = model.predict_long(texts, args.batch_size, args.stride, args.aggregate)
+            else:
+                probabilities = model.predict_batch(texts, args.batch_size)
+            for (record, _), probability in zip(batch, probabilities):
+                label = constants.CLASS_CHATGPT if probability >= args.threshold else constants.CLASS_HUMAN
+                record['probability'] = float(probability)
+                record['label'] = constants.ANSWER_CLASS[label]
+                output_file.write(json.dumps(record) + '\n')
+            output_file.flush()
+
+            n_docs += len(batch)
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                windows = f', {model.window_rate():.1f} windows/sec' if args.long else ''
+                print(f'{n_docs} docs, {n_docs / (now - start):.1f} docs/sec{windows}', file=sys.stderr)
+                last_report = now
+
+    elapsed = time.perf_counter() - start
+    print(f'Scored {n_docs} docs in {elapsed:.2f}s ({n_docs / max(elapsed, 1e-9):.1f} docs/sec)', file=sys.stderr)
+    if args.long:
+        print(f'{model.windows_scored} windows, {model.window_rate():.1f} windows/sec', file=sys.stderr)
+    if cache is not None:
+        print(f'Prediction cache: {cache.stats()}', file=sys.stderr)
+
+def convert_embeddings(args):
+    import embeddings
+
+    start = time.perf_counter()
+    target = embeddings.convert(args.embeddings)
+    print(f'Embeddings cached in {target} ({time.perf_counter() - start:.1f}s)', file=sys.stderr)
+
+def kfold(args):
+    from dataset import Dataset
+    from model import Model
+
+    if args.seed is not None:
+        from tensorflow import keras
+        keras.utils.set_random_seed(args.seed)
+
+    model = Model.load(args.model)
+    dataset = Dataset.from_json(args.dataset, balancing=args.balancing)
+    start = time.perf_counter()
+    cm, accuracy, precision, recall, fscore = model.kfold(dataset, args.batch_size, args.epochs, workers=args.workers, seed=args.seed)
+    print('Confusion matrix:\n', cm)
+    print(f'Accuracy: {accuracy*100:.2f}%')
+    print(f'Precision: {precision*100:.2f}%')
+    print(f'Recall: {recall*100:.2f}%')
+    print(f'F1-score: {fscore*100:.2f}%')
+    print(f'{time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+def train(args):
+    from callbacks import TelemetryCallback, log_path
+    from dataset import Dataset
+    from model import Model
+    from training import TrainingControl, checkpoint_dir
+
+    if args.seed is not None:
+        from tensorflow import keras
+        keras.utils.set_random_seed(args.seed)
+
+    model = Model.load(args.model)
+    if args.stream:
+        telemetry = TelemetryCallback(args.batch_size, args.log or log_path(), name=model.name)
+        start = time.perf_counter()
+        model.train_stream(args.dataset, args.batch_size, args.epochs, args.balancing, callbacks=[telemetry])
+        print(f'Trained in {time.perf_counter() - start:.1f}s, telemetry in {telemetry.path}', file=sys.stderr)
+        model.save(args.output)
+        print(f'Saved to {args.output}', file=sys.stderr)
+        if args.test:
+            model.test(Dataset.from_json(args.test))
+        return
+
+    dataset = Dataset.from_json(args.dataset, balancing=args.balancing)
+    control = TrainingControl(
+        validation_split=args.validation_split,
+        patience=args.patience,
+        min_delta=args.min_delta,
+        checkpoint_dir=args.checkpoint_dir or checkpoint_dir(model.name),
+        checkpoint_every=args.checkpoint_every,
+        time_limit=args.time_limit * 60 if args.time_limit else None,
+        resume=not args.restart,
+    )
+    telemetry = TelemetryCallback(args.batch_size, args.log or log_path(), name=model.name)
+
+    start = time.perf_counter()
+    model.train(dataset, args.batch_size, args.epochs, callbacks=[telemetry], control=control)
+    summary = control.summary()
+    if summary['initial_epoch']:
+        print(f"Resumed from epoch {summary['initial_epoch']} in {control.checkpoint_dir}", file=sys.stderr)
+    if summary.get('stopped_epoch'):
+        print(f"Stopped early at epoch {summary['stopped_epoch']}, best epoch {summary['best_epoch']} ({control.monitor} {summary['best']:.4f})", file=sys.stderr)
+    if summary['timed_out']:
+        print(f"Time limit reached, rerun the same command to resume from {control.checkpoint_dir}", file=sys.stderr)
+    print(f'Trained in {time.perf_counter() - start:.1f}s, telemetry in {telemetry.path}', file=sys.stderr)
+
+    model.save(args.output)
+    print(f'Saved to {args.output}', file=sys.stderr)
+
+    if args.test:
+        model.test(Dataset.from_json(args.test))
+
+def lengths(args):
+    from dataset import Dataset
+    from model import Model
+
+    dataset = Dataset.from_json(args.dataset)
+    Model._preprocess(dataset)
+    profile = dataset.length_profile(args.coverage)
+    print(f"{profile['texts']} texts, {profile['mean']:.1f} tokens on average, longest {profile['max']}")
+    print('Percentiles: ' + ', '.join(f'p{p} {n}' for p, n in profile['percentiles'].items()))
+    print(f"Recommended sequence length: {profile['recommended_length']} ({profile['truncated']*100:.1f}% of texts truncated)")
+
+def export(args):
+    from dataset import Dataset
+    from model import Model
+
+    model = Model.load(args.model)
+    dataset = Dataset.from_json(args.dataset) if args.dataset else None
+    model.export(args.output, tflite=not args.no_tflite, quantization=args.quantization, calibration=dataset, calibration_samples=args.calibration_samples)
+    print(f'Exported {model.name} to {args.output}', file=sys.stderr)
+
+    if dataset is not None and not args.no_tflite:
+        from inference import Scorer, accuracy_delta
+        scorer = Scorer.load(args.output, 'tflite')
+        Model._preprocess(dataset)
+        texts = dataset.get_texts()
+        report = accuracy_delta(model.predict_batch(texts), scorer.predict_batch(texts), dataset.get_labels())
+        print(f"Keras accuracy {report['reference_accuracy']*100:.2f}%, TFLite ({args.quantization}) {report['accuracy']*100:.2f}% ({report['accuracy_delta']*100:+.2f} points)")
+        print(f"Same label for {report['agreement']*100:.2f}% of texts, probability difference mean {report['mean_abs_difference']:.5f} max {report['max_abs_difference']:.5f}")
+
+def serve(args):
+    import server
+
+    if args.backend == 'keras':
+        from cache import PredictionCache
+        from model import Model
+        scorer = Model.load(args.model, PredictionCache(path=args.cache) if args.cache else None)
+    else:
+        from inference import Scorer
+        scorer = Scorer.load(args.model, args.backend)
+    scorer.predict_batch(["warm up"])
+
+    server.run(
+        scorer.predict_batch,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+        max_queue=args.max_queue,
+        timeout=args.timeout,
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless tools for the ChatGPT answer detector")
+    parser.add_argument('--preprocess-cache', help="SQLite file keeping normalized training texts across runs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = subparsers.add_parser('score', help="score a JSONL or plain text file with a saved model")
+    score_parser.add_argument('model', help="saved model directory")
+    score_parser.add_argument('input', help="JSONL file (one object per line) or text file (one document per line), '-' for stdin")
+    score_parser.add_argument('-o', '--output', default='-', help="JSONL output file, '-' for stdout")
+    score_parser.add_argument('--format', choices=['auto', 'jsonl', 'text'], default='auto')
+    score_parser.add_argument('--field', default='text', help="JSON field holding the text to score")
+    score_parser.add_argument('--batch-size', type=int, default=256)
+    score_parser.add_argument('--threshold', type=float, default=0.5)
+    score_parser.add_argument('--report-every', type=float, default=10.0, help="seconds between throughput reports")
+    score_parser.add_argument('--cache', help="SQLite file caching predictions across runs")
+    score_parser.add_argument('--long', action='store_true', help="score overlapping token windows instead of truncating long documents")
+    score_parser.add_argument('--stride', type=positive_int, help="tokens between window starts, at most the sequence length, half of it by default")
+    score_parser.add_argument('--aggregate', choices=['max', 'mean', 'weighted'], default='max', help="how window scores combine per document")
+    score_parser.set_defaults(func=score)
+
+    convert_parser = subparsers.add_parser('convert-embeddings', help="cache an embeddings .txt file as a memory-mappable binary")
+    convert_parser.add_argument('embeddings', help="GloVe-style text file")
+    convert_parser.set_defaults(func=convert_embeddings)
+
+    kfold_parser = subparsers.add_parser('kfold', help="10-fold cross-validation of a saved model architecture")
+    kfold_parser.add_argument('model', help="saved model directory")
+    kfold_parser.add_argument('dataset', help="HC3-style JSONL file")
+    kfold_parser.add_argument('--batch-size', type=int, default=32)
+    kfold_parser.add_argument('--epochs', type=int, default=5)
+    kfold_parser.add_argument('--workers', type=int, default=1, help="folds trained in parallel processes")
+    kfold_parser.add_argument('--seed', type=int)
+    kfold_parser.add_argument('--balancing', action='store_true')
+    kfold_parser.set_defaults(func=kfold)
+
+    train_parser = subparsers.add_parser('train', help="train a saved model with validation, early stopping and resumable checkpoints")
+    train_parser.add_argument('model', help="saved model directory")
+    train_parser.add_argument('dataset', help="HC3-style JSONL file")
+    train_parser.add_argument('-o', '--output', required=True, help="directory to save the trained model to")
+    train_parser.add_argument('--batch-size', type=int, default=32)
+    train_parser.add_argument('--epochs', type=int, default=5)
+    train_parser.add_argument('--validation-split', type=float, default=0.1, help="share of the training set held out for validation, 0 to disable")
+    train_parser.add_argument('--patience', type=int, help="stop after this many epochs without improvement and restore the best weights")
+    train_parser.add_argument('--min-delta', type=float, default=0.0)
+    train_parser.add_argument('--checkpoint-dir', help=f"defaults to {constants.CHECKPOINT_DIR}/<model name>")
+    train_parser.add_argument('--checkpoint-every', type=int, default=1, help="epochs between checkpoints")
+    train_parser.add_argument('--restart', action='store_true', help="discard existing checkpoints instead of resuming")
+    train_parser.add_argument('--time-limit', type=float, help="wall-clock budget in minutes")
+    train_parser.add_argument('--log', help="telemetry JSONL file")
+    train_parser.add_argument('--test', help="HC3-style JSONL file to evaluate on after training")
+    train_parser.add_argument('--seed', type=int)
+    train_parser.add_argument('--balancing', action='store_true')
+    train_parser.add_argument('--stream', action='store_true', help="read the file batch by batch in file order instead of loading it first; no validation split, early stopping, checkpoints or time limit")
+    train_parser.set_defaults(func=train)
+
+    lengths_parser = subparsers.add_parser('lengths', help="token length distribution of a corpus and a recommended truncation length")
+    lengths_parser.add_argument('dataset', help="HC3-style JSONL file")
+    lengths_parser.add_argument('--coverage', type=float, default=0.95, help="share of texts that should fit untruncated")
+    lengths_parser.set_defaults(func=lengths)
+
+    export_parser = subparsers.add_parser('export', help="export an inference-only artifact (SavedModel signature + quantized TFLite)")
+    export_parser.add_argument('model', help="saved model directory")
+    export_parser.add_argument('output', help="export directory")
+    export_parser.add_argument('--no-tflite', action='store_true', help="only write the SavedModel serving signature")
+    export_parser.add_argument('--quantization', choices=['none', 'dynamic', 'float16', 'int8'], default='dynamic', help="TFLite weights: float32, dynamic-range int8, float16, or int8 calibrated on --dataset")
+    export_parser.add_argument('--dataset', help="HC3-style JSONL file for int8 calibration and the accuracy-delta report")
+    export_parser.add_argument('--calibration-samples', type=int, default=200)
+    export_parser.set_defaults(func=export)
+
+    serve_parser = subparsers.add_parser('serve', help="HTTP scoring service with dynamic micro-batching")
+    serve_parser.add_argument('model', help="saved model directory, or export directory with --backend savedmodel/tflite")
+    serve_parser.add_argument('--backend', choices=['keras', 'savedmodel', 'tflite'], default='keras')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--max-batch-size', type=int, default=64, help="texts merged into one inference call")
+    serve_parser.add_argument('--max-wait-ms', type=float, default=5.0, help="how long the first request of a batch waits for others")
+    serve_parser.add_argument('--max-queue', type=int, default=1024, help="pending requests before answering 503")
+    serve_parser.add_argument('--timeout', type=float, default=5.0, help="per-request timeout in seconds")
+    serve_parser.add_argument('--cache', help="SQLite file caching predictions across restarts (keras backend)")
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    if args.preprocess_cache:
+        from cache import PreprocessCache
+        from model import Model
+        Model.preprocess_cache = PreprocessCache(path=args.preprocess_cache)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
 CLASS_HUMAN = 0
 CLASS_CHATGPT = 1
 
-ANSWER_CLASS = { CLASS_HUMAN: 'Human Answer', CLASS_CHATGPT: 'ChatGPT Answer' }
\ No newline at end of file
+ANSWER_CLASS = { CLASS_HUMAN: 'Human Answer', CLASS_CHATGPT: 'ChatGPT Answer' }
+
+CACHE_DIR = "cache"
+LOG_DIR = "logs"
+CHECKPOINT_DIR = "checkpoints"
\ No newline at end of file
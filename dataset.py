@@ -1,22 +1,123 @@
+from __future__ import annotations
+
+import array
+import hashlib
 import json
+import multiprocessing
+import os
 import random
-import tensorflow as tf
+import numpy as np
 
 import constants
+import preprocessing
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+def map_texts(func, texts:list, workers:int=1, chunksize:int=2048) -> list:
+    if workers > 1 and len(texts) > chunksize:
+        with multiprocessing.Pool(workers) as pool:
+            return pool.map(func, texts, chunksize)
+    return [func(text) for text in texts]
+
+class TextColumn:
+    def __init__(self, buffer:bytes, offsets:np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_texts(cls, texts):
+        buffer = bytearray()
+        offsets = array.array('q', [0])
+        for text in texts:
+            buffer += text.encode('utf8')
+            offsets.append(len(buffer))
+        return cls(bytes(buffer), np.frombuffer(offsets, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def take(self, rows:np.ndarray) -> list:
+        buffer = self.buffer
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        return [buffer[start:end].decode('utf8') for start, end in zip(starts, ends)]
+
+    def iter_bytes(self, rows:np.ndarray):
+        buffer = self.buffer
+        starts = self.offsets[rows].tolist()
+        ends = self.offsets[rows + 1].tolist()
+        for start, end in zip(starts, ends):
+            yield buffer[start:end]
+
+    def lengths(self, rows:np.ndarray) -> np.ndarray:
+        return self.offsets[rows + 1] - self.offsets[rows]
+
+# TensorFlow is imported where it is used, so loading and transforming datasets stays light.
+def tf_normalize(texts:tf.Tensor) -> tf.Tensor:
+    # Graph version of preprocessing.normalize, so it can run inside tf.data/SavedModel functions.
+    import tensorflow as tf
+    texts = tf.strings.regex_replace(texts, r"\\n", " ")
+    texts = tf.strings.regex_replace(texts, r"[^\x00-\x7f]", " ")
+    texts = tf.strings.regex_replace(texts, r"('s|'ve|n't|'re|'d|'ll)", r" \1")
+    texts = tf.strings.regex_replace(texts, r"[^A-Za-z0-9(),!?'`]", " ")
+    texts = tf.strings.regex_replace(texts, r"([,!()?])", r" \1 ")
+    return tf.strings.lower(texts)
+
+def bucket_boundaries(sequence_length:int, smallest:int=8) -> list:
+    boundaries = []
+    boundary = smallest
+    while boundary < sequence_length:
+        boundaries.append(boundary)
+        boundary *= 2
+    return boundaries
+
+def trim_padding(sequence:tf.Tensor) -> tf.Tensor:
+    import tensorflow as tf
+    # padding id 0 only ever trails the tokens; keep one position so empty texts still convolve
+    return sequence[:tf.maximum(tf.math.count_nonzero(sequence, dtype=tf.int32), 1)]
+
+def trim_batch_padding(sequences:tf.Tensor) -> tf.Tensor:
+    import tensorflow as tf
+    # a batch is cut to its own longest text
+    return sequences[:, :tf.maximum(tf.reduce_max(tf.math.count_nonzero(sequences, axis=1, dtype=tf.int32)), 1)]
+
+def permutation(n:int) -> np.ndarray:
+    return np.random.default_rng(random.getrandbits(64)).permutation(n)
 
 class Dataset:
     def __init__(self, data:list, shuffle=True, name:str=""):
         self.name = name
-        if shuffle:
-            random.shuffle(data)
-        self.data = data
+        self.texts = TextColumn.from_texts(datum['text'] for datum in data)
+        self.labels = np.fromiter((datum['label'] for datum in data), dtype=np.uint8, count=len(data))
+        self.indexes = permutation(len(data)) if shuffle else None
+        self.stages = frozenset()
 
     @classmethod
-    def from_json(cls, path:str, balancing=False, name:str=""):
-        data = []
-        with open(path, mode='r', encoding='utf8') as json_file:
-            for line in json_file:
-                item = json.loads(line)
+    def from_columns(cls, texts:TextColumn, labels:np.ndarray, indexes:np.ndarray=None, shuffle=False, name:str="", stages=frozenset()):
+        dataset = cls.__new__(cls)
+        dataset.name = name
+        dataset.texts = texts
+        dataset.labels = labels
+        dataset.indexes = indexes
+        dataset.stages = frozenset(stages)
+        if shuffle:
+            rows = dataset.rows()
+            dataset.indexes = rows[permutation(len(rows))]
+        return dataset
+
+    @staticmethod
+    def iter_json(path:str, balancing=False, progress=None, progress_every:int=1000):
+        total_bytes = os.path.getsize(path)
+        read_bytes = 0
+        with open(path, mode='rb') as json_file:
+            for i, line in enumerate(json_file):
+                read_bytes += len(line)
+                if not line.strip():
+                    continue
+                item = json_loads(line)
                 if balancing:
                     n_sample = min(len(item['human_answers']), len(item['chatgpt_answers']))
                     human_answers = random.sample(item['human_answers'], n_sample)
@@ -24,78 +125,209 @@ class Dataset:
                 else:
                     human_answers = item['human_answers']
                     chatgpt_answers = item['chatgpt_answers']
-                    
+
                 for answer in human_answers:
-                    data.append({
-                        'text': answer,
-                        'label': constants.CLASS_HUMAN
-                        })
+                    yield answer, constants.CLASS_HUMAN
                 for answer in chatgpt_answers:
-                    data.append({
-                        'text': answer,
-                        'label': constants.CLASS_CHATGPT
-                        })
+                    yield answer, constants.CLASS_CHATGPT
+
+                if progress is not None and i % progress_every == 0:
+                    progress(read_bytes, total_bytes)
+        if progress is not None:
+            progress(read_bytes, total_bytes)
+
+    @classmethod
+    def from_json(cls, path:str, balancing=False, name:str="", progress=None):
+        labels = array.array('B')
+
+        def answers():
+            for text, label in cls.iter_json(path, balancing, progress):
+                labels.append(label)
+                yield text
+
+        texts = TextColumn.from_texts(answers())
         
         if not name:
             name = path.split('/')[-1]
 
-        return cls(data, name=name)
+        return cls.from_columns(texts, np.frombuffer(labels, dtype=np.uint8), shuffle=True, name=name)
+
+    @classmethod
+    def stream_json(cls, path:str, batch_size:int=32, balancing=False, func=None, vectorizer=None, trim=False) -> tf.data.Dataset:
+        import tensorflow as tf
+
+        def generator():
+            for text, label in cls.iter_json(path, balancing):
+                if func is not None:
+                    text = func(text)
+                    if text is None:
+                        continue
+                yield text, label
+
+        dataset = tf.data.Dataset.from_generator(
+            generator,
+            output_signature=(tf.TensorSpec(shape=(), dtype=tf.string), tf.TensorSpec(shape=(), dtype=tf.uint8))
+        ).batch(batch_size)
+        if vectorizer is None:
+            dataset = dataset.map(lambda x, y: (tf.expand_dims(x, -1), y))
+        else:
+            dataset = dataset.map(lambda x, y: (vectorizer(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+            if trim:
+                dataset = dataset.map(lambda x, y: (trim_batch_padding(x), y))
+        return dataset.prefetch(tf.data.AUTOTUNE)
     
+    def rows(self) -> np.ndarray:
+        if self.indexes is None:
+            return np.arange(len(self.labels))
+        return self.indexes
+
+    def view(self, rows:np.ndarray, shuffle=False, name:str=""):
+        return Dataset.from_columns(self.texts, self.labels, rows, shuffle=shuffle, name=name or self.name, stages=self.stages)
+
+    def copy(self, name:str=""):
+        texts = TextColumn.from_texts(self.get_texts())
+        return Dataset.from_columns(texts, self.get_labels(), name=name or self.name, stages=self.stages)
+
     def sample_index(self, n):
-        return random.sample(range(len(self.data)), n)
+        return random.sample(range(self.total()), n)
     
     def get_from_indexes(self, indexes):
-        return [ self.data[i] for i in indexes ]
+        return self.view(self.rows()[np.asarray(indexes, dtype=np.int64)])
+
+    def apply(self, func, workers:int=1):
+        mapped = self.map(func, workers)
+        self.texts, self.labels, self.indexes = mapped.texts, mapped.labels, mapped.indexes
+
+    def apply_batch(self, func):
+        self.texts = TextColumn.from_texts(func(self.get_texts()))
+        self.labels = self.get_labels()
+        self.indexes = None
 
-    def apply(self, func):
-        for i in range(len(self.data)):
-            self.data[i]['text'] = func(self.data[i]['text'])
+    def mark(self, stage:str):
+        self.stages = self.stages | {stage}
 
-    def filter(self, func):
-        for datum in self.data:
-            if func( datum['text'] ):
-                self.data.remove(datum)
+    def filter(self, func, workers:int=1):
+        drop = np.fromiter(map_texts(func, self.get_texts(), workers), dtype=bool, count=self.total())
+        self.indexes = self.rows()[~drop]
+
+    def filter_apply(self, func, workers:int=1):
+        results = map_texts(func, self.get_texts(), workers)
+        keep = np.fromiter((result is not None for result in results), dtype=bool, count=len(results))
+        self.texts = TextColumn.from_texts(result for result in results if result is not None)
+        self.labels = self.get_labels()[keep]
+        self.indexes = None
+
+    def map(self, func, workers:int=1):
+        texts = TextColumn.from_texts(map_texts(func, self.get_texts(), workers))
+        return Dataset.from_columns(texts, self.get_labels(), name=self.name, stages=self.stages)
 
     def split(self, ratio, shuffle=True):
-        data = self.data
-        
         if shuffle:
-            random.shuffle(data)
+            self.indexes = self.rows()[permutation(self.total())]
+        rows = self.rows()
 
-        n_data1 = int(ratio * len(data))
-        data1 = data[-n_data1:]
-        data2 = data[:-n_data1]
+        n_data1 = int(ratio * len(rows))
+        rows1 = rows[-n_data1:]
+        rows2 = rows[:-n_data1]
 
-        return (Dataset(data1, name=self.name+" (1)"), Dataset(data2, name=self.name+" (2)"))
+        return (self.view(rows1, shuffle=True, name=self.name+" (1)"), self.view(rows2, shuffle=True, name=self.name+" (2)"))
 
     def get_texts(self, label=None):
-        if label is None:
-            return  [x['text'] for x in self.data]
-        
-        return [x['text'] for x in self.data if x['label'] == label]
+        rows = self.rows()
+        if label is not None:
+            rows = rows[self.labels[rows] == label]
+        return self.texts.take(rows)
     
     def get_labels(self):
-        return  [x['label'] for x in self.data]
+        return self.labels[self.rows()]
     
     def make_xy(self, batch_size:int=32) -> tf.data.Dataset:
-        x = self.get_texts()
-        x = [[s] for s in x]
+        import tensorflow as tf
+
+        x = np.array(self.get_texts(), dtype=object).reshape(-1, 1)
         y = self.get_labels()
 
         return tf.data.Dataset.from_tensor_slices((x, y)).batch(batch_size)
     
+    def token_lengths(self) -> np.ndarray:
+        return np.fromiter((len(text.split()) for text in self.texts.iter_bytes(self.rows())), dtype=np.int64, count=self.total())
+
+    def text_digests(self) -> np.ndarray:
+        # one 64-bit digest of label and text per row, independent of where the row is stored
+        rows = self.rows()
+        digests = b''.join(
+            hashlib.blake2b(bytes((label,)) + text, digest_size=8).digest()
+            for text, label in zip(self.texts.iter_bytes(rows), self.labels[rows].tolist())
+        )
+        return np.frombuffer(digests, dtype=np.uint64)
+
+    def length_profile(self, coverage:float=0.95, multiple:int=8) -> dict:
+        lengths = self.token_lengths()
+        if not len(lengths):
+            raise ValueError("cannot profile the token lengths of an empty dataset")
+        recommended = max(int(np.ceil(np.quantile(lengths, coverage) / multiple)) * multiple, multiple)
+        return {
+            'texts': len(lengths),
+            'mean': float(lengths.mean()),
+            'max': int(lengths.max()),
+            'percentiles': {p: int(np.percentile(lengths, p)) for p in (50, 90, 95, 99)},
+            'recommended_length': recommended,
+            'truncated': float((lengths > recommended).mean()),
+        }
+
+    def make_pipeline(self, batch_size:int=32, vectorizer=None, cache_path:str=None, shuffle_buffer:int=0, bucket_boundaries:list=None) -> tf.data.Dataset:
+        import tensorflow as tf
+
+        if bucket_boundaries and vectorizer is None:
+            raise ValueError("length bucketing needs a vectorizer")
+        rows = self.rows()
+        labels = self.labels[rows]
+
+        def generator():
+            yield from zip(self.texts.iter_bytes(rows), labels)
+
+        dataset = tf.data.Dataset.from_generator(
+            generator,
+            output_signature=(tf.TensorSpec(shape=(), dtype=tf.string), tf.TensorSpec(shape=(), dtype=tf.uint8))
+        )
+        dataset = dataset.batch(1024)
+        if preprocessing.STAGE_NORMALIZE not in self.stages:
+            dataset = dataset.map(lambda x, y: (tf_normalize(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+        if vectorizer is not None:
+            dataset = dataset.map(lambda x, y: (vectorizer(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+        else:
+            dataset = dataset.map(lambda x, y: (tf.expand_dims(x, -1), y))
+        dataset = dataset.unbatch()
+        if bucket_boundaries:
+            dataset = dataset.map(lambda x, y: (trim_padding(x), y))
+        if cache_path is not None:
+            dataset = dataset.cache(cache_path)
+        if shuffle_buffer:
+            dataset = dataset.shuffle(shuffle_buffer)
+
+        if bucket_boundaries:
+            # each batch holds texts of similar length and is padded only to its own longest text
+            dataset = dataset.bucket_by_sequence_length(
+                lambda x, y: tf.shape(x)[0],
+                bucket_boundaries,
+                [batch_size] * (len(bucket_boundaries) + 1),
+            )
+            return dataset.prefetch(tf.data.AUTOTUNE)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
     def kfold(self, n:int):
+        rows = self.rows()
         data_size = self.total()
         k, m = divmod(data_size, n)
         for i in range(n):
             k_start = i*k+min(i, m)
             k_end = (i+1)*k+min(i+1, m)
-            k_data = self.data[k_start:k_end]
-            k_rest = self.data[0:k_start] + self.data[k_end:data_size]
-            yield Dataset(k_data), Dataset(k_rest)
+            k_data = rows[k_start:k_end]
+            k_rest = np.concatenate((rows[0:k_start], rows[k_end:data_size]))
+            yield self.view(k_data, shuffle=True), self.view(k_rest, shuffle=True)
     
     def total(self):
-        return len(self.data)
+        return len(self.rows())
 
     def save(self, path):
         json_object = {
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import threading
+import numpy as np
+from numpy.lib.format import open_memmap
+
+import constants
+
+SAMPLE_BYTES = 1 << 20
+
+def fingerprint(path:str) -> str:
+    stat = os.stat(path)
+    digest = hashlib.blake2b(f'{stat.st_size}:{stat.st_mtime_ns}'.encode(), digest_size=16)
+    with open(path, mode='rb') as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if stat.st_size > 2 * SAMPLE_BYTES:
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+        digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+def cache_path(path:str) -> str:
+    name = os.path.basename(path)
+    return os.path.join(constants.CACHE_DIR, 'embeddings', f'{name}-{fingerprint(path)}')
+
+def convert(path:str, progress=None) -> str:
+    target = cache_path(path)
+    if os.path.isdir(target):
+        return target
+
+    with open(path, mode='rb') as f:
+        first_line = f.readline()
+        if len(first_line.split()) == 2:
+            # word2vec/fastText header ("<count> <dim>")
+            first_line = f.readline()
+        f.seek(0)
+        n_lines = 0
+        last_byte = b'\n'
+        for chunk in iter(lambda: f.read(SAMPLE_BYTES), b''):
+            n_lines += chunk.count(b'\n')
+            last_byte = chunk[-1:]
+        n_lines += last_byte != b'\n'
+    embedding_dim = len(first_line.split()) - 1
+
+    tmp = f'{target}.tmp{os.getpid()}-{threading.get_ident()}'
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        n_rows = _write_cache(path, tmp, n_lines, embedding_dim, progress)
+        if n_rows != n_lines:
+            vectors = np.load(os.path.join(tmp, 'vectors.npy'), mmap_mode='r')
+            np.save(os.path.join(tmp, 'vectors_trimmed.npy'), vectors[:n_rows])
+            del vectors
+            os.replace(os.path.join(tmp, 'vectors_trimmed.npy'), os.path.join(tmp, 'vectors.npy'))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # another process or thread finished the same conversion first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+def _write_cache(path:str, target:str, n_lines:int, embedding_dim:int, progress=None, progress_every:int=10000) -> int:
+    vectors = open_memmap(os.path.join(target, 'vectors.npy'), mode='w+', dtype=np.float32, shape=(n_lines, embedding_dim))
+    n_rows = 0
+    with open(path, mode='rb') as f, open(os.path.join(target, 'words.txt'), mode='w', encoding='utf8', newline='') as words_file:
+        for i, line in enumerate(f):
+            if progress is not None and i % progress_every == 0:
+                progress(i, n_lines)
+            parts = line.decode('utf8').split(maxsplit=1)
+            if len(parts) != 2:
+                continue
+            word, coefs = parts
+            coefs = np.fromstring(coefs, "f", sep=" ")
+            if coefs.size != embedding_dim:
+                continue
+            vectors[n_rows] = coefs
+            words_file.write(word + '\n')
+            n_rows += 1
+    vectors.flush()
+    return n_rows
+
+def load(path:str):
+    target = convert(path)
+    with open(os.path.join(target, 'words.txt'), encoding='utf8', newline='') as words_file:
+        words = words_file.read().split('\n')[:-1]
+    vectors = np.load(os.path.join(target, 'vectors.npy'), mmap_mode='r')
+    return words, vectors
+
+def embedding_matrix(path:str, vocab:list) -> np.ndarray:
+    words, vectors = load(path)
+    word_index = dict(zip(vocab, range(len(vocab))))
+
+    found = {}
+    for row, word in enumerate(words):
+        i = word_index.get(word)
+        if i is not None:
+            found[i] = row
+
+    matrix = np.zeros((len(vocab) + 2, vectors.shape[1]), dtype=np.float32)
+    if found:
+        indexes = np.fromiter(found.keys(), dtype=np.int64, count=len(found))
+        rows = np.fromiter(found.values(), dtype=np.int64, count=len(found))
+        order = np.argsort(rows)
+        matrix[indexes[order]] = vectors[rows[order]]
+    return matrix
+
+def hashed_embedding_matrix(path:str, num_buckets:int, buckets_fn, chunk_size:int=100000) -> np.ndarray:
+    # every word of the file is hashed like the corpus tokens; a bucket is the mean of its words
+    words, vectors = load(path)
+    sums = np.zeros((num_buckets, vectors.shape[1]), dtype=np.float64)
+    counts = np.zeros((num_buckets,), dtype=np.int64)
+    for start in range(0, len(words), chunk_size):
+        buckets = buckets_fn(words[start:start+chunk_size], num_buckets)
+        np.add.at(sums, buckets, vectors[start:start+chunk_size])
+        counts += np.bincount(buckets, minlength=num_buckets)
+    return (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import numpy as np
+
+class StreamingEvaluator:
+    # one histogram of predicted probabilities per class; every metric at every threshold is read off their cumulative sums,
+    # so thresholds are resolved to 1/bins. Bin i holds [i/bins, (i+1)/bins) and the last bin holds exactly 1.
+    def __init__(self, bins:int=1000):
+        self.bins = bins
+        self.histograms = np.zeros((2, bins + 1), dtype=np.int64)
+        self._tails = None
+
+    def update(self, probabilities, labels):
+        probabilities = np.clip(np.ravel(np.asarray(probabilities, dtype=np.float64)), 0.0, 1.0)
+        labels = np.ravel(np.asarray(labels)).astype(np.intp)
+        indexes = (probabilities * self.bins).astype(np.intp)
+        self.histograms += np.bincount(labels * (self.bins + 1) + indexes, minlength=2 * (self.bins + 1)).reshape(2, self.bins + 1)
+        self._tails = None
+
+    def merge(self, other:'StreamingEvaluator'):
+        if other.bins != self.bins:
+            raise ValueError(f"cannot merge evaluators with {self.bins} and {other.bins} bins")
+        self.histograms += other.histograms
+        self._tails = None
+
+    def total(self) -> int:
+        return int(self.histograms.sum())
+
+    def tails(self) -> np.ndarray:
+        # tails[c, i]: examples of class c with a probability of at least i/bins, i = 0..bins + 1
+        if self._tails is None:
+            self._tails = np.zeros((2, self.bins + 2), dtype=np.int64)
+            self._tails[:, :-1] = np.cumsum(self.histograms[:, ::-1], axis=1)[:, ::-1]
+        return self._tails
+
+    def edge(self, threshold:float) -> int:
+        return int(np.clip(round(threshold * self.bins), 0, self.bins))
+
+    def confusion_matrix(self, threshold:float=0.5) -> np.ndarray:
+        # rows are true labels and columns predicted labels, as in sklearn
+        tails = self.tails()
+        i = self.edge(threshold)
+        negatives, positives = tails[:, 0]
+        fp, tp = tails[0, i], tails[1, i]
+        return np.array([[negatives - fp, fp], [positives - tp, tp]])
+
+    def scores(self, threshold:float=0.5) -> tuple:
+        # accuracy and support-weighted precision, recall and F1, with 0 for undefined ratios
+        cm = self.confusion_matrix(threshold)
+        total = cm.sum()
+        if total == 0:
+            return cm, 0.0, 0.0, 0.0, 0.0
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        correct = np.diag(cm)
+        precision = np.divide(correct, predicted, out=np.zeros(2), where=predicted > 0)
+        recall = np.divide(correct, support, out=np.zeros(2), where=support > 0)
+        denominator = support + predicted
+        fscore = np.divide(2 * correct, denominator, out=np.zeros(2), where=denominator > 0)
+        weights = support / total
+        return cm, float(correct.sum() / total), float(weights @ precision), float(weights @ recall), float(weights @ fscore)
+
+    def roc_curve(self) -> tuple:
+        # false and true positive rates for thresholds from above 1 down to 0
+        tails = self.tails()[:, ::-1]
+        negatives, positives = np.maximum(tails[:, -1], 1)
+        return tails[0] / negatives, tails[1] / positives, self._thresholds()
+
+    def _thresholds(self) -> np.ndarray:
+        return np.arange(self.bins + 1, -1, -1) / self.bins
+
+    def roc_auc(self) -> float:
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def pr_curve(self) -> tuple:
+        # precision and recall for thresholds from above 1 down to 0; precision is 1 where nothing is predicted positive
+        tails = self.tails()[:, ::-1]
+        predicted = tails[0] + tails[1]
+        precision = np.divide(tails[1], predicted, out=np.ones(self.bins + 2), where=predicted > 0)
+        recall = tails[1] / max(tails[1, -1], 1)
+        return precision, recall, self._thresholds()
+
+    def average_precision(self) -> float:
+        precision, recall, _ = self.pr_curve()
+        return float(np.sum(np.diff(recall) * precision[1:]))
+
+    def report(self, threshold:float=0.5) -> str:
+        cm, accuracy, precision, recall, fscore = self.scores(threshold)
+        return (
+            f'Confusion matrix (threshold {self.edge(threshold) / self.bins:g}):\n {cm}\n'
+            f'Accuracy: {accuracy*100:.2f}%\n'
+            f'Precision: {precision*100:.2f}%\n'
+            f'Recall: {recall*100:.2f}%\n'
+            f'F1-score: {fscore*100:.2f}%\n'
+            f'ROC AUC: {self.roc_auc():.4f}\n'
+            f'Average precision: {self.average_precision():.4f}'
+        )
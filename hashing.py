@@ -0,0 +1,32 @@
+import tensorflow as tf
+from tensorflow import keras
+
+from vocabulary import PADDING_ID
+
+def token_buckets(tokens, num_buckets:int):
+    # bucket 0 stays free for padding
+    return tf.strings.to_hash_bucket_fast(tokens, num_buckets - 1) + 1
+
+@keras.utils.register_keras_serializable(package='detector')
+class HashingVectorizer(keras.layers.Layer):
+    def __init__(self, num_buckets:int, sequence_length:int=200, **kwargs):
+        if num_buckets < 2:
+            raise ValueError(f"hashing needs at least 2 buckets, bucket 0 is reserved for padding (got {num_buckets})")
+        super().__init__(**kwargs)
+        self.num_buckets = num_buckets
+        self.sequence_length = sequence_length
+
+    def call(self, inputs):
+        if inputs.shape.rank == 2:
+            inputs = tf.squeeze(inputs, -1)
+        tokens = tf.strings.split(inputs)
+        ids = tf.ragged.map_flat_values(token_buckets, tokens, self.num_buckets)
+        return ids.to_tensor(default_value=PADDING_ID, shape=[None, self.sequence_length])
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({'num_buckets': self.num_buckets, 'sequence_length': self.sequence_length})
+        return config
+
+def word_buckets(words:list, num_buckets:int):
+    return token_buckets(tf.constant(words, dtype=tf.string), num_buckets).numpy()
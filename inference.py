@@ -0,0 +1,89 @@
+import json
+import os
+import numpy as np
+
+import preprocessing
+from vocabulary import Vocabulary
+
+class Scorer:
+    def __init__(self, backend:str, predict_fn, meta:dict):
+        self.backend = backend
+        self.predict_fn = predict_fn
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path:str, backend:str='auto'):
+        with open(os.path.join(path, 'meta.json'), encoding='utf8') as meta_file:
+            meta = json.load(meta_file)
+
+        if backend == 'auto':
+            backend = 'tflite' if 'tflite' in meta else 'savedmodel'
+        if backend == 'tflite':
+            if 'tflite' not in meta:
+                raise ValueError(f"{path} has no TFLite model (hashing vectorizer or --no-tflite), use the savedmodel backend")
+            return cls(backend, cls._load_tflite(path, meta), meta)
+        return cls(backend, cls._load_savedmodel(path), meta)
+
+    @staticmethod
+    def _load_savedmodel(path:str):
+        import tensorflow as tf
+
+        serve = tf.saved_model.load(os.path.join(path, 'saved_model')).signatures['serving_default']
+
+        def predict_fn(texts:list) -> np.ndarray:
+            return serve(texts=tf.constant(texts, dtype=tf.string))['probabilities'].numpy()
+
+        return predict_fn
+
+    @staticmethod
+    def _load_tflite(path:str, meta:dict):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        interpreter = Interpreter(model_path=os.path.join(path, meta['tflite']))
+        input_index = interpreter.get_input_details()[0]['index']
+        input_dtype = interpreter.get_input_details()[0]['dtype']
+        output_index = interpreter.get_output_details()[0]['index']
+        vocabulary = Vocabulary.load(os.path.join(path, meta['vocabulary']))
+        sequence_length = meta['sequence_length']
+        allocated_shape = None
+
+        def predict_fn(texts:list) -> np.ndarray:
+            nonlocal allocated_shape
+            sequences = vocabulary.encode(preprocessing.normalize_many(texts), sequence_length).astype(input_dtype)
+            if sequences.shape != allocated_shape:
+                interpreter.resize_tensor_input(input_index, sequences.shape)
+                interpreter.allocate_tensors()
+                allocated_shape = sequences.shape
+            interpreter.set_tensor(input_index, sequences)
+            interpreter.invoke()
+            return np.ravel(interpreter.get_tensor(output_index))
+
+        return predict_fn
+
+    def predict_batch(self, texts:list, batch_size:int=256) -> np.ndarray:
+        texts = list(texts)
+        probabilities = np.empty((len(texts),), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            probabilities[start:start+batch_size] = self.predict_fn(texts[start:start+batch_size])
+        return probabilities
+
+    def predict(self, text:str) -> float:
+        return float(self.predict_batch([text])[0])
+
+def accuracy_delta(reference:np.ndarray, probabilities:np.ndarray, labels:np.ndarray, threshold:float=0.5) -> dict:
+    reference_predictions = reference >= threshold
+    predictions = probabilities >= threshold
+    reference_accuracy = float(np.mean(reference_predictions == labels))
+    accuracy = float(np.mean(predictions == labels))
+    return {
+        'reference_accuracy': reference_accuracy,
+        'accuracy': accuracy,
+        'accuracy_delta': accuracy - reference_accuracy,
+        'agreement': float(np.mean(predictions == reference_predictions)),
+        'max_abs_difference': float(np.max(np.abs(probabilities - reference), initial=0.0)),
+        'mean_abs_difference': float(np.mean(np.abs(probabilities - reference))) if len(reference) else 0.0,
+    }
\ No newline at end of file
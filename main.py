@@ -1,103 +1,150 @@
+from __future__ import annotations
+
 import sys
-import numpy as np
-from PySide6.QtWidgets import QApplication, QDialog, QFileDialog, QTableWidgetItem
-from PySide6.QtCore import QThread, Signal, QTimer
+import time
+from typing import TYPE_CHECKING
+from PySide6.QtWidgets import QApplication, QCheckBox, QDialog, QDoubleSpinBox, QFileDialog, QGridLayout, QLabel, QProgressBar, QPushButton, QSlider, QSpinBox, QTableWidgetItem
+from PySide6.QtCore import QMutex, QMutexLocker, QThread, QWaitCondition, Qt, Signal, QTimer
+import tasks
+from tasks import Task
 from ui import numain, nuaction, nuresult, nutt, nupd
 
-from model import Model
-from dataset import Dataset
+# model pulls in TensorFlow, Keras and scikit-learn: it is imported by the tasks that need it,
+# and preloaded by the warm_up task once the first window is on screen
+if TYPE_CHECKING:
+    from model import Model
+    from dataset import Dataset
+    from evaluation import StreamingEvaluator
+    from training import TrainingControl
 
-class CompilingThread(QThread):
-    finished = Signal(Model)
+def warm_up(task:Task):
+    import model
 
-    def __init__(self, corpus:Dataset, embeddings_path:str, filters:int, kernel_sizes:list, dropout:float):
-        super(CompilingThread, self).__init__()
-        self.corpus = corpus
-        self.embeddings_path = embeddings_path
-        self.filters = filters
-        self.kernel_sizes = kernel_sizes
-        self.dropout = dropout
+def compile_model(task:Task, corpus:Dataset, embeddings_path:str, filters:int, kernel_sizes:list, dropout:float, hash_buckets:int=0) -> Model:
+    from model import Model
 
-    def run(self):
-        model = None
-        try:
-            model = Model.create_from_params(
-                self.corpus,
-                self.embeddings_path,
-                self.filters,
-                self.kernel_sizes,
-                self.dropout,
-            )
-        finally:
-            self.finished.emit(model)
-
-class LoadingModelThread(QThread):
-    finished = Signal(Model)
-
-    def __init__(self, model_path:str):
-        super(LoadingModelThread, self).__init__()
-        self.model_path = model_path
+    return Model.create_from_params(corpus, embeddings_path, filters, kernel_sizes, dropout, hash_buckets=hash_buckets)
 
-    def run(self):
-        model = None
-        try:
-            model = Model.load(self.model_path)
-        finally:
-            self.finished.emit(model)
+def load_model(task:Task, model_path:str) -> Model:
+    from model import Model
 
-class TrainTestThread(QThread):
-    finished = Signal(tuple)
+    return Model.load(model_path)
 
-    def __init__(self, model:Model, train_data:Dataset, test_data:Dataset, train_batch:int, epochs:int):
-        super(TrainTestThread, self).__init__()
-        self.model = model
-        self.train_data = train_data
-        self.test_data = test_data
-        self.train_batch = train_batch
-        self.epochs = epochs
+def load_dataset(task:Task, dataset_path:str) -> Dataset:
+    from dataset import Dataset
 
-    def run(self):
-        metrics = None
-        try:
-            self.model.train(self.train_data, self.train_batch, self.epochs)
-            metrics = self.model.test(self.test_data)
-        finally:
-            self.finished.emit(metrics)
-
-class SaveModelThread(QThread):
-    def __init__(self, path:str, model:Model):
-        super(SaveModelThread, self).__init__()
+    return Dataset.from_json(dataset_path, progress=task.report)
+
+def convert_embeddings(task:Task, embeddings_path:str) -> str:
+    # parsing the text file into the memory-mapped cache is the slow part of compiling, start it early
+    import embeddings
+
+    return embeddings.convert(embeddings_path, progress=task.report)
+
+def train_test(task:Task, model:Model, train_data:Dataset, test_data:Dataset, train_batch:int, epochs:int, control:TrainingControl=None) -> tuple:
+    from callbacks import TelemetryCallback, log_path
+
+    telemetry = TelemetryCallback(train_batch, log_path(), on_record=task.signals.telemetry.emit, name=model.name)
+    model.train(train_data, train_batch, epochs, callbacks=[tasks.keras_callback(task, epochs), telemetry], control=control)
+    if control is not None:
+        task.signals.telemetry.emit({'event': 'control', **control.summary()})
+    task.check()
+    return model.evaluate(test_data)
+
+def save_model(task:Task, model:Model, path:str):
+    model.save(path)
+    model.name = path.split('/')[-1]
+
+class PredictionThread(QThread):
+    result = Signal(int, float, float)
+    failed = Signal(int, str)
+
+    def __init__(self, model:Model):
+        super(PredictionThread, self).__init__()
         self.model = model
-        self.path = path
+        self.mutex = QMutex()
+        self.condition = QWaitCondition()
+        self.pending = None
+        self.stopped = False
+
+    def submit(self, request_id:int, text:str):
+        # only the newest request is kept, anything still waiting is superseded
+        with QMutexLocker(self.mutex):
+            self.pending = (request_id, text)
+            self.condition.wakeOne()
+
+    def stop(self):
+        with QMutexLocker(self.mutex):
+            self.stopped = True
+            self.condition.wakeOne()
+        self.wait()
 
     def run(self):
-        self.model.save(self.path)
-        self.model.name = self.path.split('/')[-1]
+        try:
+            self.model.predict_batch(["warm up"])
+        except Exception:
+            # the same error comes back with the first real request, where it is reported
+            pass
+        while True:
+            with QMutexLocker(self.mutex):
+                while self.pending is None and not self.stopped:
+                    self.condition.wait(self.mutex)
+                if self.stopped:
+                    return
+                request_id, text = self.pending
+                self.pending = None
+
+            start = time.perf_counter()
+            try:
+                probability = float(self.model.predict_batch([text])[0])
+            except Exception as error:
+                # the thread keeps serving, the next edit is scored again
+                self.failed.emit(request_id, str(error))
+                continue
+            self.result.emit(request_id, probability, (time.perf_counter() - start) * 1000)
 
 class ResultWindow(QDialog):
-    def __init__(self, model:Model, result:tuple):
+    def __init__(self, model:Model, evaluator:StreamingEvaluator):
         super(ResultWindow, self).__init__()
         self.ui = nuresult.Ui_Form()
         self.ui.setupUi(self)
 
         self.model = model
+        self.evaluator = evaluator
         self.ui.backButton.clicked.connect(self.show_model_summary)
 
-        cm = result[0]
+        # every figure is read off the evaluator's histograms, so moving the threshold never re-runs the model
+        self.thresholdLabel = QLabel(self)
+        self.thresholdSlider = QSlider(Qt.Horizontal, self)
+        self.thresholdSlider.setRange(0, evaluator.bins)
+        self.thresholdSlider.setValue(evaluator.edge(0.5))
+        self.thresholdSlider.valueChanged.connect(self.show_scores)
+        self.curveLabel = QLabel(self)
+        self.ui.verticalLayout.insertWidget(0, self.thresholdLabel)
+        self.ui.verticalLayout.insertWidget(1, self.thresholdSlider)
+        self.ui.verticalLayout.addWidget(self.curveLabel)
+        self.show_scores()
+
+    def show_scores(self):
+        threshold = self.thresholdSlider.value() / self.evaluator.bins
+        cm, accuracy, precision, recall, fscore = self.evaluator.scores(threshold)
+        self.thresholdLabel.setText(f"Threshold: {threshold:.3f}")
         self.ui.confusionTable.setItem(0, 0, QTableWidgetItem(str(cm[0][0])))
         self.ui.confusionTable.setItem(0, 1, QTableWidgetItem(str(cm[0][1])))
         self.ui.confusionTable.setItem(1, 0, QTableWidgetItem(str(cm[1][0])))
         self.ui.confusionTable.setItem(1, 1, QTableWidgetItem(str(cm[1][1])))
 
-        accuracy = f'{result[1] * 100:.2f}%'
-        precision = f'{result[2] * 100:.2f}%'
-        recall = f'{result[3] * 100:.2f}%'
-        fscore = f'{result[4] * 100:.2f}%'
+        self.ui.accuracyText.setText(f'{accuracy * 100:.2f}%')
+        self.ui.precisionText.setText(f'{precision * 100:.2f}%')
+        self.ui.recallText.setText(f'{recall * 100:.2f}%')
+        self.ui.fscoreText.setText(f'{fscore * 100:.2f}%')
 
-        self.ui.accuracyText.setText(accuracy)
-        self.ui.precisionText.setText(precision)
-        self.ui.recallText.setText(recall)
-        self.ui.fscoreText.setText(fscore)
+        fpr, tpr, _ = self.evaluator.roc_curve()
+        i = self.evaluator.bins + 1 - self.thresholdSlider.value()
+        self.curveLabel.setText(
+            f"ROC AUC {self.evaluator.roc_auc():.4f} · average precision {self.evaluator.average_precision():.4f}\n"
+            f"TPR {tpr[i] * 100:.2f}% · FPR {fpr[i] * 100:.2f}% at this threshold"
+        )
     
     def show_model_summary(self):
         self.summary_window = ModelSummaryWindow(self.model)
@@ -113,32 +160,148 @@ class TrainTestWindow(QDialog):
         self.model = model
         self.train_loaded = False
         self.test_loaded = False
+        self.train_loading_task = None
+        self.test_loading_task = None
+        self.train_test_task = None
 
         self.ui.trainSelectButton.clicked.connect(self.load_train_data)
         self.ui.testSelectButton.clicked.connect(self.load_test_data)
         self.ui.pushButton.clicked.connect(self.start_train_test)
         self.ui.backButton.clicked.connect(self.show_model_summary)
 
+        self.cancelButton = QPushButton("Cancel", self)
+        self.cancelButton.setDisabled(True)
+        self.cancelButton.clicked.connect(self.cancel_train_test)
+        self.ui.gridLayout.addWidget(self.cancelButton, 4, 2, 1, 1)
+
+        self.validationSplitSpinBox = QDoubleSpinBox(self)
+        self.validationSplitSpinBox.setRange(0.0, 0.5)
+        self.validationSplitSpinBox.setSingleStep(0.05)
+        self.validationSplitSpinBox.setValue(0.1)
+        self.patienceSpinBox = QSpinBox(self)
+        self.patienceSpinBox.setRange(0, 100)
+        self.patienceSpinBox.setValue(3)
+        self.timeLimitSpinBox = QSpinBox(self)
+        self.timeLimitSpinBox.setRange(0, 100000)
+        self.timeLimitSpinBox.setSuffix(" min")
+        self.resumeCheckBox = QCheckBox(self)
+        self.controlLayout = QGridLayout()
+        self.controlLayout.addWidget(QLabel("Validation split", self), 0, 0, 1, 1)
+        self.controlLayout.addWidget(self.validationSplitSpinBox, 0, 1, 1, 1)
+        self.controlLayout.addWidget(QLabel("Early stopping patience\n(0: off)", self), 0, 2, 1, 1)
+        self.controlLayout.addWidget(self.patienceSpinBox, 0, 3, 1, 1)
+        self.controlLayout.addWidget(QLabel("Time limit\n(0: none)", self), 1, 0, 1, 1)
+        self.controlLayout.addWidget(self.timeLimitSpinBox, 1, 1, 1, 1)
+        self.controlLayout.addWidget(self.resumeCheckBox, 1, 2, 1, 2)
+        self.ui.gridLayout.addLayout(self.controlLayout, 6, 0, 1, 3)
+        self.update_resume_checkbox()
+
+        self.steps_per_epoch = None
+        self.trainingProgressBar = QProgressBar(self)
+        self.trainingProgressBar.setVisible(False)
+        self.telemetryLabel = QLabel(self)
+        self.telemetryLabel.setWordWrap(True)
+        self.ui.gridLayout.addWidget(self.trainingProgressBar, 7, 0, 1, 3)
+        self.ui.gridLayout.addWidget(self.telemetryLabel, 8, 0, 1, 3)
+
+    def update_resume_checkbox(self):
+        from training import checkpoint_dir, read_state
+
+        state = read_state(checkpoint_dir(self.model.name))
+        self.resumeCheckBox.setVisible(state is not None)
+        self.resumeCheckBox.setChecked(state is not None)
+        if state is not None:
+            self.resumeCheckBox.setText(f"Resume from checkpoint (epoch {state['epoch']})")
+
     def start_train_test(self):
-        self.train_test_thread = TrainTestThread(
+        from training import TrainingControl, checkpoint_dir
+
+        control = TrainingControl(
+            validation_split=self.validationSplitSpinBox.value(),
+            patience=self.patienceSpinBox.value() or None,
+            checkpoint_dir=checkpoint_dir(self.model.name),
+            time_limit=self.timeLimitSpinBox.value() * 60 or None,
+            resume=self.resumeCheckBox.isVisible() and self.resumeCheckBox.isChecked(),
+        )
+        self.train_test_task = Task(
+            train_test,
             self.model,
             self.train_data,
             self.test_data,
             self.ui.batchSpinBox.value(),
-            self.ui.epochsSpinBox.value()
+            self.ui.epochsSpinBox.value(),
+            control
         )
 
-        self.train_test_thread.finished.connect(self.show_result)
-        self.train_test_thread.start()
+        self.train_test_task.signals.progress.connect(lambda percent, message: self.ui.pushButton.setText(message))
+        self.train_test_task.signals.telemetry.connect(self.show_telemetry)
+        self.train_test_task.signals.finished.connect(self.show_result)
+        self.train_test_task.signals.failed.connect(self.train_test_failed)
+        self.train_test_task.signals.cancelled.connect(self.train_test_cancelled)
+        tasks.manager().start(self.train_test_task)
         self.disable_inputs()
+        self.cancelButton.setEnabled(True)
+        self.steps_per_epoch = None
+        self.trainingProgressBar.setRange(0, 0)
+        self.trainingProgressBar.setVisible(True)
+        self.telemetryLabel.setText("Preparing training data...")
+
+    def show_telemetry(self, record:dict):
+        from callbacks import format_record
+
+        if record['event'] == 'epoch':
+            self.steps_per_epoch = record['step']
+        steps = record.get('steps') or self.steps_per_epoch
+        if steps and record.get('step') is not None:
+            # the step count is unknown until the first epoch of a generator-fed pipeline has ended
+            done = (record['epoch'] - 1) * steps + min(record['step'], steps)
+            self.trainingProgressBar.setRange(0, record['epochs'] * steps)
+            self.trainingProgressBar.setValue(done)
+        if record['event'] == 'train_end':
+            self.trainingProgressBar.setRange(0, 1)
+            self.trainingProgressBar.setValue(1)
+            self.telemetryLabel.setText(f"Trained in {record['seconds']:.1f}s, testing...")
+        elif record['event'] == 'control':
+            notes = []
+            if record['initial_epoch']:
+                notes.append(f"resumed from epoch {record['initial_epoch']}")
+            if record.get('stopped_epoch'):
+                notes.append(f"stopped early at epoch {record['stopped_epoch']}, best epoch {record['best_epoch']} restored")
+            if record['timed_out']:
+                notes.append("time limit reached, training can be resumed")
+            if notes:
+                self.telemetryLabel.setText(self.telemetryLabel.text() + " (" + "; ".join(notes) + ")")
+        elif record['event'] != 'train_begin':
+            self.telemetryLabel.setText(format_record(record))
+
+    def cancel_train_test(self):
+        if self.train_test_task is not None:
+            self.train_test_task.cancel()
+            self.cancelButton.setDisabled(True)
+            self.ui.pushButton.setText("Cancelling...")
+
+    def train_test_failed(self, error:str):
+        # e.g. a checkpoint made for another training set, which unticking Resume discards
+        self.train_test_stopped()
+        self.telemetryLabel.setText(f"Training failed: {error}")
+
+    def train_test_cancelled(self):
+        self.train_test_stopped()
+        self.telemetryLabel.setText("")
+
+    def train_test_stopped(self):
+        self.train_test_task = None
+        self.trainingProgressBar.setVisible(False)
+        self.update_resume_checkbox()
+        self.cancelButton.setDisabled(True)
+        self.ui.pushButton.setText("Train-Test")
+        self.enable_inputs()
     
-    def show_result(self, result:tuple):
-        if result is None:
-            self.enable_inputs()
-        else:
-            self.result_window = ResultWindow(self.model, result)
-            self.result_window.show()
-            self.close()
+    def show_result(self, evaluator:StreamingEvaluator):
+        self.train_test_task = None
+        self.result_window = ResultWindow(self.model, evaluator)
+        self.result_window.show()
+        self.close()
     
     def disable_inputs(self):
         self.ui.trainDatasetView.setDisabled(True)
@@ -149,6 +312,10 @@ class TrainTestWindow(QDialog):
         self.ui.epochsSpinBox.setDisabled(True)
         self.ui.pushButton.setDisabled(True)
         self.ui.backButton.setDisabled(True)
+        self.validationSplitSpinBox.setDisabled(True)
+        self.patienceSpinBox.setDisabled(True)
+        self.timeLimitSpinBox.setDisabled(True)
+        self.resumeCheckBox.setDisabled(True)
     
     def enable_inputs(self):
         self.ui.trainDatasetView.setEnabled(True)
@@ -159,12 +326,34 @@ class TrainTestWindow(QDialog):
         self.ui.epochsSpinBox.setEnabled(True)
         self.ui.pushButton.setEnabled(True)
         self.ui.backButton.setEnabled(True)
+        self.validationSplitSpinBox.setEnabled(True)
+        self.patienceSpinBox.setEnabled(True)
+        self.timeLimitSpinBox.setEnabled(True)
+        self.resumeCheckBox.setEnabled(True)
     
     def load_train_data(self):
         dataset_path, _ = QFileDialog.getOpenFileName(self, "Select Dataset File", "", "JSON files (*.json *.jsonl)")
-        self.train_data = Dataset.from_json(dataset_path)
-        self.ui.trainDatasetView.setText(f'{self.train_data.name} - {self.train_data.total()}')
+        if dataset_path:
+            # the train and test sets load side by side on the shared pool
+            if self.train_loading_task is not None:
+                self.train_loading_task.cancel()
+            self.train_loaded = False
+            self.train_loading_task = task = Task(load_dataset, dataset_path)
+            task.signals.progress.connect(lambda percent, message: self.ui.trainDatasetView.setText(f'Loading... {percent}%'))
+            task.signals.finished.connect(lambda dataset: task is self.train_loading_task and self.set_train_data(dataset))
+            task.signals.failed.connect(lambda error: task is self.train_loading_task and self.set_train_data(None))
+            tasks.manager().start(task)
+            self.ui.pushButton.setDisabled(True)
+
+    def set_train_data(self, dataset:Dataset):
+        self.train_loading_task = None
         self.ui.trainDatasetView.setEnabled(True)
+        if dataset is None:
+            self.ui.trainDatasetView.setText("Error when loading dataset")
+            return
+
+        self.train_data = dataset
+        self.ui.trainDatasetView.setText(f'{self.train_data.name} - {self.train_data.total()}')
 
         self.train_loaded = True
         if self.train_loaded and self.test_loaded:
@@ -172,9 +361,26 @@ class TrainTestWindow(QDialog):
     
     def load_test_data(self):
         dataset_path, _ = QFileDialog.getOpenFileName(self, "Select Dataset File", "", "JSON files (*.json *.jsonl)")
-        self.test_data = Dataset.from_json(dataset_path)
-        self.ui.testDatasetView.setText(f'{self.test_data.name} - {self.test_data.total()}')
+        if dataset_path:
+            if self.test_loading_task is not None:
+                self.test_loading_task.cancel()
+            self.test_loaded = False
+            self.test_loading_task = task = Task(load_dataset, dataset_path)
+            task.signals.progress.connect(lambda percent, message: self.ui.testDatasetView.setText(f'Loading... {percent}%'))
+            task.signals.finished.connect(lambda dataset: task is self.test_loading_task and self.set_test_data(dataset))
+            task.signals.failed.connect(lambda error: task is self.test_loading_task and self.set_test_data(None))
+            tasks.manager().start(task)
+            self.ui.pushButton.setDisabled(True)
+
+    def set_test_data(self, dataset:Dataset):
+        self.test_loading_task = None
         self.ui.testDatasetView.setEnabled(True)
+        if dataset is None:
+            self.ui.testDatasetView.setText("Error when loading dataset")
+            return
+
+        self.test_data = dataset
+        self.ui.testDatasetView.setText(f'{self.test_data.name} - {self.test_data.total()}')
 
         self.test_loaded = True
         if self.train_loaded and self.test_loaded:
@@ -185,6 +391,12 @@ class TrainTestWindow(QDialog):
         self.summary_window.show()
         self.close()
 
+    def closeEvent(self, event):
+        for task in (self.train_loading_task, self.test_loading_task, self.train_test_task):
+            if task is not None:
+                task.cancel()
+        super(TrainTestWindow, self).closeEvent(event)
+
 class PredictWindow(QDialog):
     def __init__(self, model:Model):
         super(PredictWindow, self).__init__()
@@ -195,20 +407,51 @@ class PredictWindow(QDialog):
 
         self.ui.predictButton.clicked.connect(self.predict)
         self.ui.backButton.clicked.connect(self.show_model_summary)
+
+        self.request_id = 0
+        self.prediction_thread = PredictionThread(model)
+        self.prediction_thread.result.connect(self.show_prediction)
+        self.prediction_thread.failed.connect(self.show_prediction_error)
+        self.prediction_thread.start()
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(250)
+        self.debounce_timer.timeout.connect(self.predict)
+        self.ui.textEdit.textChanged.connect(self.debounce_timer.start)
     
     def predict(self):
+        self.debounce_timer.stop()
         text = self.ui.textEdit.toPlainText()
-        probabilities = self.model.predict(text)
-        prediction = str(np.where(probabilities < 0.5, 'Human Answer','ChatGPT Answer').flat[0])
+        self.request_id += 1
+        if not text.strip():
+            self.ui.predictionView.setText("")
+            return
+        self.prediction_thread.submit(self.request_id, text)
+
+    def show_prediction(self, request_id:int, probability:float, latency:float):
+        if request_id != self.request_id:
+            return
+        prediction = 'Human Answer' if probability < 0.5 else 'ChatGPT Answer'
         self.ui.predictionView.setStyleSheet("background-color: rgb(47, 255, 10)")
         QTimer.singleShot(50, lambda :self.ui.predictionView.setStyleSheet("background-color: rgb(255, 255, 255)") )
-        self.ui.predictionView.setText(prediction)
+        self.ui.predictionView.setText(f'{prediction} ({probability*100:.1f}% ChatGPT, {latency:.1f} ms)')
     
+    def show_prediction_error(self, request_id:int, error:str):
+        if request_id != self.request_id:
+            return
+        self.ui.predictionView.setText(f'Prediction failed: {error}')
+
     def show_model_summary(self):
         self.summary_window = ModelSummaryWindow(self.model)
         self.summary_window.show()
         self.close()
 
+    def closeEvent(self, event):
+        self.debounce_timer.stop()
+        self.prediction_thread.stop()
+        super(PredictWindow, self).closeEvent(event)
+
 class ModelSummaryWindow(QDialog):
     def __init__(self, model:Model):
         super(ModelSummaryWindow, self).__init__()
@@ -236,9 +479,10 @@ class ModelSummaryWindow(QDialog):
         
         if path:
             self.disable_inputs()
-            self.save_model_thread = SaveModelThread(path, self.model)
-            self.save_model_thread.finished.connect(self.enable_inputs)
-            self.save_model_thread.start()
+            self.save_model_task = Task(save_model, self.model, path)
+            self.save_model_task.signals.finished.connect(self.enable_inputs)
+            self.save_model_task.signals.failed.connect(self.enable_inputs)
+            tasks.manager().start(self.save_model_task)
     
     def show_train_test(self):
         self.train_test_window = TrainTestWindow(self.model)
@@ -282,27 +526,82 @@ class ModelConfigWindow(QDialog):
         self.ui.embeddingsSelectButton.clicked.connect(self.get_embeddings_path)
         self.ui.compileButton.clicked.connect(self.start_compile)
 
+        self.corpus = None
+        self.embeddings_path = None
+        self.loading_task = None
+        self.corpus_loading_task = None
+        self.embeddings_task = None
+        self.hashBucketsLabel = QLabel("Hash buckets\n(0: vocabulary)", self.ui.groupBox)
+        self.hashBucketsSpinBox = QSpinBox(self.ui.groupBox)
+        self.hashBucketsSpinBox.setRange(0, 10000000)
+        self.hashBucketsSpinBox.setSingleStep(10000)
+        self.ui.gridLayout.addWidget(self.hashBucketsLabel, 7, 0, 1, 1)
+        self.ui.gridLayout.addWidget(self.hashBucketsSpinBox, 7, 1, 1, 1)
+        self.hashBucketsSpinBox.valueChanged.connect(self.update_compile_button)
+
     def load_model(self):
         model_path = QFileDialog.getExistingDirectory(self, "Select Model Directory", "")
         if model_path:
-            self.loading_thread = LoadingModelThread(model_path)
-            self.loading_thread.finished.connect(self.show_model_summary)
-            self.loading_thread.start()
+            self.loading_task = Task(load_model, model_path)
+            self.loading_task.signals.finished.connect(self.show_model_summary)
+            self.loading_task.signals.failed.connect(lambda error: self.show_model_summary(None))
+            tasks.manager().start(self.loading_task)
             self.disable_inputs()
 
     def load_corpus(self):
         dataset_path, _ = QFileDialog.getOpenFileName(self, "Select Dataset File", "", "JSON files (*.json *.jsonl)")
-        self.corpus = Dataset.from_json(dataset_path)
-        self.ui.corpusTextView.setText(f'{self.corpus.name} - {self.corpus.total()}')
+        if dataset_path:
+            if self.corpus_loading_task is not None:
+                self.corpus_loading_task.cancel()
+            self.corpus = None
+            self.corpus_loading_task = task = Task(load_dataset, dataset_path)
+            task.signals.progress.connect(lambda percent, message: self.ui.corpusTextView.setText(f'Loading... {percent}%'))
+            task.signals.finished.connect(lambda corpus: task is self.corpus_loading_task and self.set_corpus(corpus))
+            task.signals.failed.connect(lambda error: task is self.corpus_loading_task and self.set_corpus(None))
+            tasks.manager().start(task)
+            self.ui.compileButton.setDisabled(True)
+
+    def set_corpus(self, corpus:Dataset):
+        self.corpus_loading_task = None
         self.ui.corpusTextView.setEnabled(True)
+        if corpus is None:
+            self.ui.corpusTextView.setText("Error when loading dataset")
+        else:
+            self.corpus = corpus
+            self.ui.corpusTextView.setText(f'{self.corpus.name} - {self.corpus.total()}')
+        self.update_compile_button()
 
     def get_embeddings_path(self):
         embeddings_path, _ = QFileDialog.getOpenFileName(self, "Select Embeddings File", "", "Text files (*.txt)")
         if embeddings_path:
-            self.embeddings_path = embeddings_path
-            embeddings_name = self.embeddings_path.split('/')[-1]
+            # the embeddings are parsed while the corpus loads instead of when Compile is pressed
+            if self.embeddings_task is not None:
+                self.embeddings_task.cancel()
+            self.embeddings_path = None
+            embeddings_name = embeddings_path.split('/')[-1]
+            self.embeddings_task = task = Task(convert_embeddings, embeddings_path)
+            task.signals.progress.connect(lambda percent, message: self.ui.embeddingsTextView.setText(f'{embeddings_name} - parsing... {percent}%'))
+            task.signals.finished.connect(lambda cache: task is self.embeddings_task and self.set_embeddings_path(embeddings_path))
+            task.signals.failed.connect(lambda error: task is self.embeddings_task and self.set_embeddings_path(None))
+            tasks.manager().start(task)
             self.ui.embeddingsTextView.setText(embeddings_name)
             self.ui.embeddingsTextView.setEnabled(True)
+            self.ui.compileButton.setDisabled(True)
+
+    def set_embeddings_path(self, embeddings_path:str):
+        self.embeddings_task = None
+        if embeddings_path is None:
+            self.ui.embeddingsTextView.setText("Error when parsing embeddings")
+        else:
+            self.embeddings_path = embeddings_path
+            self.ui.embeddingsTextView.setText(embeddings_path.split('/')[-1])
+        self.update_compile_button()
+
+    def update_compile_button(self):
+        # hashed token ids need no vocabulary, so the corpus is only required without hashing
+        hash_buckets = self.hashBucketsSpinBox.value()
+        vectorizer_ready = hash_buckets >= 2 if hash_buckets else self.corpus is not None
+        self.ui.compileButton.setEnabled(vectorizer_ready and self.embeddings_path is not None)
     
     def get_kernel_sizes(self):
         kernel_sizes_text = self.ui.kernelSizeTextInput.toPlainText()
@@ -310,16 +609,19 @@ class ModelConfigWindow(QDialog):
         return kernel_sizes
 
     def start_compile(self):
-        self.loading_thread = CompilingThread(
+        self.loading_task = Task(
+            compile_model,
             corpus = self.corpus,
             embeddings_path = self.embeddings_path,
             filters = self.ui.filtersSpinBox.value(),
             kernel_sizes = self.get_kernel_sizes(),
             dropout = self.ui.dropoutSpinBox.value(),
+            hash_buckets = self.hashBucketsSpinBox.value(),
         )
 
-        self.loading_thread.finished.connect(self.show_model_summary)
-        self.loading_thread.start()
+        self.loading_task.signals.finished.connect(self.show_model_summary)
+        self.loading_task.signals.failed.connect(lambda error: self.show_model_summary(None))
+        tasks.manager().start(self.loading_task)
         self.disable_inputs()
     
     def disable_inputs(self):
@@ -331,6 +633,7 @@ class ModelConfigWindow(QDialog):
         self.ui.filtersSpinBox.setDisabled(True)
         self.ui.kernelSizeTextInput.setDisabled(True)
         self.ui.dropoutSpinBox.setDisabled(True)
+        self.hashBucketsSpinBox.setDisabled(True)
         self.ui.compileButton.setDisabled(True)
     
     def enable_inputs(self):
@@ -342,7 +645,8 @@ class ModelConfigWindow(QDialog):
         self.ui.filtersSpinBox.setEnabled(True)
         self.ui.kernelSizeTextInput.setEnabled(True)
         self.ui.dropoutSpinBox.setEnabled(True)
-        self.ui.compileButton.setEnabled(True)
+        self.hashBucketsSpinBox.setEnabled(True)
+        self.update_compile_button()
     
     def show_model_summary(self, model:Model):
         if model is None:
@@ -353,12 +657,22 @@ class ModelConfigWindow(QDialog):
             self.summary_window.show()
             self.close()
 
+    def closeEvent(self, event):
+        for task in (self.corpus_loading_task, self.embeddings_task):
+            if task is not None:
+                task.cancel()
+        super(ModelConfigWindow, self).closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     form = ModelConfigWindow()
     form.show()
+    QTimer.singleShot(0, lambda: tasks.manager().start(Task(warm_up)))
 
-    sys.exit(app.exec())
+    code = app.exec()
+    tasks.manager().cancel_all()
+    tasks.manager().wait()
+    sys.exit(code)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,71 +1,256 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import hashlib
+import json
+import multiprocessing
+import os
 import statistics
+import tempfile
+import time
+import uuid
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from keras import layers, metrics
 from keras.layers import TextVectorization, Embedding
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
+from cache import PredictionCache, PreprocessCache
+import embeddings
+from evaluation import StreamingEvaluator
 import preprocessing
-from dataset import Dataset
+from dataset import Dataset, bucket_boundaries, tf_normalize
+from hashing import HashingVectorizer, word_buckets
+from training import TrainingControl
+from vocabulary import PADDING_ID, Vocabulary
+import windows
+
+QUANTIZATIONS = {'none': 'float32', 'dynamic': 'dynamic-range-int8', 'float16': 'float16', 'int8': 'int8'}
+PADDING_MASK = 'padding_mask'
 
 class Model:
-    def __init__(self, model:keras.Model, name:str):
+    preprocess_cache = PreprocessCache()
+
+    def __init__(self, model:keras.Model, name:str, fingerprint:str=None):
         self.model = model
         self.name = name
+        self.fingerprint = fingerprint or uuid.uuid4().hex
+        self.prediction_cache = None
+        # batches are only trimmed to their longest text when padding cannot change a prediction
+        self.bucketing = self.masks_padding
+        self.windows_scored = 0
+        self.window_seconds = 0.0
+        self._vocabulary = None
     
     @classmethod
-    def create_from_params(cls, corpus:Dataset, embeddings_path:str, filters:int, kernel_sizes:list, dropout:float, name:str=""):
-        vectorizer = cls._create_vectorizer(corpus)
-        embedding = cls._create_embedding(embeddings_path, vectorizer.get_vocabulary())
+    def create_from_params(cls, corpus:Dataset, embeddings_path:str, filters:int, kernel_sizes:list, dropout:float, name:str="", max_tokens:int=None, min_frequency:int=1, hash_buckets:int=None, sequence_length:int=200):
+        if hash_buckets:
+            vectorizer = HashingVectorizer(hash_buckets, sequence_length)
+            embedding = cls._create_hashed_embedding(embeddings_path, hash_buckets)
+        else:
+            vectorizer = cls._create_vectorizer(corpus, max_tokens, min_frequency, sequence_length)
+            embedding = cls._create_embedding(embeddings_path, vectorizer.get_vocabulary())
         
+        classifier = cls._create_classifier(embedding, filters, kernel_sizes, dropout)
+        return cls.from_classifier(vectorizer, classifier, name)
+
+    @classmethod
+    def from_classifier(cls, vectorizer:keras.layers.Layer, classifier:keras.Model, name:str=""):
         string_sequences_input = keras.Input(shape=(1,), dtype=tf.string)
         vectorize_layer = vectorizer(string_sequences_input)
-        embedded_sequences = embedding(vectorize_layer)
+        preds = classifier(vectorize_layer)
+        model = keras.Model(string_sequences_input, preds)
+
+        cls._compile(model)
+        cls._compile(classifier)
+
+        if not name:
+            name = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+
+        return cls(model, name)
+    
+    @classmethod
+    def _create_classifier(cls, embedding:Embedding, filters:int, kernel_sizes:list, dropout:float) -> keras.Model:
+        int_sequences_input = keras.Input(shape=(None,), dtype="int64")
+        embedded_sequences = embedding(int_sequences_input)
+        padding_mask = tf.cast(tf.not_equal(int_sequences_input, PADDING_ID), "float32")[:, :, tf.newaxis]
         convs = []
-        for kernel_size in kernel_sizes:
+        for i, kernel_size in enumerate(kernel_sizes):
             x = layers.Conv1D(filters, kernel_size, padding="same", activation="relu")(embedded_sequences)
+            # padded positions are zeroed, relu outputs are never negative, so the max only sees the text itself
+            x = layers.Multiply(name=f"{PADDING_MASK}_{i}")([x, padding_mask])
             x = layers.GlobalMaxPooling1D()(x)
             convs.append(x)
         if len(convs) > 1:
             x = tf.keras.layers.Concatenate(axis=-1)(convs)
         x = layers.Dropout(dropout)(x)
         preds = layers.Dense(1, activation="sigmoid")(x)
-        model = keras.Model(string_sequences_input, preds)
 
+        return keras.Model(int_sequences_input, preds, name="classifier")
+
+    @classmethod
+    def _compile(cls, model:keras.Model):
         model.compile(
             loss="binary_crossentropy", optimizer="adam", metrics=["acc",metrics.Precision(),metrics.Recall()]
         )
 
-        if not name:
-            name = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+    @property
+    def vectorizer(self) -> keras.layers.Layer:
+        for layer in self.model.layers:
+            if isinstance(layer, (TextVectorization, HashingVectorizer)):
+                return layer
+        return None
+
+    @property
+    def sequence_length(self) -> int:
+        vectorizer = self.vectorizer
+        if isinstance(vectorizer, HashingVectorizer):
+            return vectorizer.sequence_length
+        return vectorizer.get_config()['output_sequence_length']
+
+    @property
+    def masks_padding(self) -> bool:
+        classifier = self._find_classifier()
+        return classifier is not None and any(layer.name.startswith(PADDING_MASK) for layer in classifier.layers)
+
+    def _find_classifier(self) -> keras.Model:
+        for layer in self.model.layers:
+            if isinstance(layer, keras.Model) and layer.name == "classifier":
+                return layer
+        return None
+
+    @property
+    def classifier(self) -> keras.Model:
+        classifier = self._find_classifier()
+        if classifier is not None and getattr(classifier, 'compiled_loss', None) is None:
+            self._compile(classifier)
+        return classifier
 
-        return cls(model, name)
-    
     @classmethod
-    def load(cls, path:str):
+    def load(cls, path:str, cache:PredictionCache=None):
         name = path.split('/')[-1]
-        return cls(tf.keras.models.load_model(path), name)
+        model = cls(tf.keras.models.load_model(path), name)
+        if cache is not None:
+            # only a persistent cache needs a fingerprint that survives reloading the same files
+            model.fingerprint = cls._path_fingerprint(path)
+            model.set_prediction_cache(cache)
+        return model
+
+    @staticmethod
+    def _path_fingerprint(path:str) -> str:
+        digest = hashlib.blake2b(os.path.abspath(path).encode('utf8'), digest_size=16)
+        if not os.path.isdir(path):
+            # .h5/.keras files
+            stat = os.stat(path)
+            digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode('utf8'))
+            return digest.hexdigest()
+        for filename in ('saved_model.pb', 'keras_metadata.pb', os.path.join('variables', 'variables.index')):
+            filepath = os.path.join(path, filename)
+            if os.path.exists(filepath):
+                stat = os.stat(filepath)
+                digest.update(f'{filename}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf8'))
+        index_path = os.path.join(path, 'variables', 'variables.index')
+        if os.path.isfile(index_path):
+            with open(index_path, mode='rb') as index_file:
+                digest.update(index_file.read())
+        return digest.hexdigest()
+
+    def set_prediction_cache(self, cache:PredictionCache):
+        self.prediction_cache = cache
+        cache.bind(self.fingerprint)
+
+    def _weights_changed(self):
+        self.fingerprint = uuid.uuid4().hex
+        if self.prediction_cache is not None:
+            self.prediction_cache.bind(self.fingerprint)
     
     def save(self, path:str):
         self.model.save(path, save_format="tf")
     
+    def export(self, path:str, tflite=True, quantization:str='dynamic', calibration:Dataset=None, calibration_samples:int=200):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"unknown quantization '{quantization}', expected one of {', '.join(QUANTIZATIONS)}")
+        if quantization == 'int8' and calibration is None:
+            raise ValueError("int8 quantization needs a calibration dataset")
+        os.makedirs(path, exist_ok=True)
+        model = self.model
+        vectorizer = self.vectorizer
+        classifier = self.classifier
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None], dtype=tf.string, name='texts')])
+        def serve(texts):
+            probabilities = model(tf.expand_dims(tf_normalize(texts), -1), training=False)
+            return {'probabilities': tf.reshape(probabilities, [-1])}
+
+        module = tf.Module()
+        module.model = model
+        module.serve = serve
+        tf.saved_model.save(module, os.path.join(path, 'saved_model'), signatures={'serving_default': serve})
+
+        meta = {'name': self.name, 'saved_model': 'saved_model'}
+        # hashed token ids cannot be reproduced outside TensorFlow, those models only get the SavedModel
+        if tflite and classifier is not None and isinstance(vectorizer, TextVectorization):
+            converter = tf.lite.TFLiteConverter.from_keras_model(classifier)
+            if quantization != 'none':
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            if quantization == 'float16':
+                converter.target_spec.supported_types = [tf.float16]
+            elif quantization == 'int8':
+                converter.representative_dataset = self._representative_dataset(calibration, calibration_samples)
+            with open(os.path.join(path, 'classifier.tflite'), mode='wb') as tflite_file:
+                tflite_file.write(converter.convert())
+            Vocabulary(vectorizer.get_vocabulary()).save(os.path.join(path, 'vocab.txt'))
+            meta.update({
+                'tflite': 'classifier.tflite',
+                'quantization': QUANTIZATIONS[quantization],
+                'vocabulary': 'vocab.txt',
+                'sequence_length': self.sequence_length,
+            })
+        with open(os.path.join(path, 'meta.json'), mode='w', encoding='utf8') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+    def _representative_dataset(self, calibration:Dataset, n_samples:int):
+        sample = calibration.get_from_indexes(calibration.sample_index(min(n_samples, calibration.total())))
+        self._preprocess(sample, artifacts=False)
+        vectorizer = self.vectorizer
+
+        def representative_dataset():
+            for text in sample.get_texts():
+                sequence = vectorizer(tf.constant([text])).numpy()
+                yield [sequence[:, :max(int(np.count_nonzero(sequence)), 1)]]
+
+        return representative_dataset
+
     def summary(self, print_fn):
         self.model.summary(print_fn=print_fn)
 
-    def kfold(self, dataset:Dataset, batch_size:int, epochs:int, callbacks=None):
+    def kfold(self, dataset:Dataset, batch_size:int, epochs:int, callbacks=None, workers:int=1, seed:int=None):
         n_folds = 10
+        if seed is not None:
+            keras.utils.set_random_seed(seed)
+        # cleaned once here, the fold views inherit the stage marks and are not cleaned again
+        self._preprocess(dataset)
+        folds = list(dataset.kfold(n_folds))
+
+        if workers > 1 and callbacks:
+            raise ValueError("callbacks cannot be passed to worker processes, use workers=1")
+
+        with tempfile.TemporaryDirectory() as model_path:
+            self.save(model_path)
+            # seeded folds always run in workers: op determinism is process-wide and would slow down everything after
+            if workers > 1 or (seed is not None and not callbacks):
+                fold_metrics = self._kfold_parallel(model_path, folds, batch_size, epochs, workers, seed)
+            else:
+                fold_metrics = []
+                for i, (test_data, train_data) in enumerate(folds):
+                    print(f'Fold {i}')
+                    fold_metrics.append(_train_fold(model_path, i, test_data, train_data, batch_size, epochs, seed, callbacks))
+
         cm = [[0, 0], [0, 0]]
         accuracies = []
         precisions = []
         recalls = []
         fscores = []
-        for i, (test_data, train_data) in enumerate(dataset.kfold(n_folds)):
-            print(f'Fold {i}')
-            self.train(dataset=train_data, batch_size=batch_size, epochs=epochs, callbacks=callbacks)
-            metrics = self.test(test_data)
+        for metrics in fold_metrics:
             cm[0][0] += metrics[0][0][0]
             cm[0][1] += metrics[0][0][1]
             cm[1][0] += metrics[0][1][0]
@@ -74,7 +259,6 @@ class Model:
             precisions.append(metrics[2])
             recalls.append(metrics[3])
             fscores.append(metrics[4])
-            self._reinitialize_model()
 
         mean_accuracy = statistics.fmean(accuracies)
         mean_precision = statistics.fmean(precisions)
@@ -82,74 +266,215 @@ class Model:
         mean_fscore = statistics.fmean(fscores)
         return cm, mean_accuracy, mean_precision, mean_recall, mean_fscore
 
-    def train(self, dataset:Dataset, batch_size:int, epochs:int, callbacks=None):
-        dataset.filter(preprocessing.contains_chatgpt_error)
-        dataset.apply(preprocessing.clean_chatgpt_output)
-        dataset.apply(preprocessing.clean)
-        dataset.apply(preprocessing.lowercase)
-        dataset = dataset.make_xy(batch_size)
-        self.model.fit(dataset, batch_size=batch_size, epochs=epochs, callbacks=callbacks)
-
-    def test(self, dataset:Dataset):
-        dataset.apply(preprocessing.clean)
-        dataset.apply(preprocessing.lowercase)
-
-        predictions = self.model.predict(dataset.make_xy())
-        predictions = np.where(predictions < 0.5, 0 , 1)
-        labels = dataset.get_labels()
-        cm = confusion_matrix(labels, predictions)
-        accuracy = accuracy_score(labels, predictions)
-        precision = precision_score(labels, predictions, average='weighted', zero_division=0)
-        recall = recall_score(labels, predictions, average='weighted', zero_division=0)
-        fscore = f1_score(labels, predictions, average='weighted', zero_division=0)
-        print('Confusion matrix:\n', cm)
-        print(f'Accuracy: {accuracy*100:.2f}%')
-        print(f'Precision: {precision*100:.2f}%')
-        print(f'Recall: {recall*100:.2f}%')
-        print(f'F1-score: {fscore*100:.2f}%')
-
-        return cm, accuracy, precision, recall, fscore
-
-    def predict(self, text:str):
-        text = preprocessing.clean(text)
-        text = preprocessing.lowercase(text)
-        probabilities = self.model.predict(
-            [text]
-        )
+    def _kfold_parallel(self, model_path:str, folds:list, batch_size:int, epochs:int, workers:int, seed:int=None) -> list:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [
+                executor.submit(_kfold_worker, model_path, i, test_data.copy(), train_data.copy(), batch_size, epochs, threads, seed)
+                for i, (test_data, train_data) in enumerate(folds)
+            ]
+            fold_metrics = []
+            for i, future in enumerate(futures):
+                fold_metrics.append(future.result())
+                print(f'Fold {i} done')
+        return fold_metrics
+
+    def train(self, dataset:Dataset, batch_size:int, epochs:int, callbacks=None, cache_dir:str=None, control:TrainingControl=None):
+        self._preprocess(dataset)
+        classifier = self.classifier
+        self._weights_changed()
+        validation = None
+        if control is not None:
+            dataset, validation = control.split(dataset, epochs)
+            callbacks = list(callbacks or []) + control.callbacks(classifier if classifier is not None else self.model)
+        initial_epoch = 0 if control is None else epochs if control.finished else min(control.initial_epoch, epochs)
+
+        if classifier is None:
+            pipeline = dataset.make_pipeline(batch_size, shuffle_buffer=64*batch_size)
+            validation_pipeline = validation.make_pipeline(256) if validation is not None else None
+            self.model.fit(pipeline, epochs=epochs, initial_epoch=initial_epoch, validation_data=validation_pipeline, callbacks=callbacks)
+            return
+
+        boundaries = bucket_boundaries(self.sequence_length) if self.bucketing else None
+        with tempfile.TemporaryDirectory(dir=cache_dir) as pipeline_cache:
+            pipeline = dataset.make_pipeline(
+                batch_size,
+                vectorizer=self.vectorizer,
+                cache_path=os.path.join(pipeline_cache, 'sequences'),
+                shuffle_buffer=64*batch_size,
+                bucket_boundaries=boundaries,
+            )
+            validation_pipeline = None
+            if validation is not None:
+                validation_pipeline = validation.make_pipeline(
+                    256,
+                    vectorizer=self.vectorizer,
+                    cache_path=os.path.join(pipeline_cache, 'validation'),
+                    bucket_boundaries=boundaries,
+                )
+            classifier.fit(pipeline, epochs=epochs, initial_epoch=initial_epoch, validation_data=validation_pipeline, callbacks=callbacks)
+
+    def train_stream(self, path:str, batch_size:int, epochs:int, balancing=False, callbacks=None):
+        # the file is re-read every epoch, so training starts before it has been parsed once
+        classifier = self.classifier
+        self._weights_changed()
+        if classifier is None:
+            dataset = Dataset.stream_json(path, batch_size, balancing, preprocessing.prepare_training_text)
+            self.model.fit(dataset, epochs=epochs, callbacks=callbacks)
+            return
+
+        dataset = Dataset.stream_json(path, batch_size, balancing, preprocessing.prepare_training_text, vectorizer=self.vectorizer, trim=self.bucketing)
+        classifier.fit(dataset, epochs=epochs, callbacks=callbacks)
+
+    def evaluate(self, dataset:Dataset, bins:int=1000) -> StreamingEvaluator:
+        self._preprocess(dataset, artifacts=False)
+        evaluator = StreamingEvaluator(bins)
+
+        classifier = self.classifier
+        if classifier is None or not self.bucketing:
+            pipeline = dataset.make_pipeline(256)
+            model = self.model
+        else:
+            # bucketing reorders the texts, so the labels are taken from the same batches
+            pipeline = dataset.make_pipeline(256, vectorizer=self.vectorizer, bucket_boundaries=bucket_boundaries(self.sequence_length))
+            model = classifier
+        for x, y in pipeline:
+            evaluator.update(model.predict_on_batch(x), y.numpy())
+        return evaluator
+
+    def test(self, dataset:Dataset, threshold:float=0.5):
+        evaluator = self.evaluate(dataset)
+        print(evaluator.report(threshold))
+        return evaluator.scores(threshold)
+
+    def predict(self, text:str, long_document=False, stride:int=None, aggregate:str='max'):
+        if long_document:
+            return self.predict_long([text], stride=stride, aggregate=aggregate).reshape(1, 1)
+        return self.predict_batch([text]).reshape(1, 1)
+
+    def predict_batch(self, texts:list, batch_size:int=256) -> np.ndarray:
+        texts = preprocessing.normalize_many(list(texts))
+        cache = self.prediction_cache
+        if cache is None:
+            return self._predict_normalized(texts, batch_size)
+
+        keys = cache.keys(texts)
+        probabilities = np.array([np.nan if p is None else p for p in cache.get_many(keys)], dtype=np.float32)
+        missing = {}
+        for i, key in enumerate(keys):
+            if np.isnan(probabilities[i]):
+                missing.setdefault(key, []).append(i)
+        if missing:
+            first = [rows[0] for rows in missing.values()]
+            computed = self._predict_normalized([texts[i] for i in first], batch_size)
+            for rows, probability in zip(missing.values(), computed):
+                probabilities[rows] = probability
+            cache.put_many(list(missing.keys()), computed)
 
         return probabilities
 
+    def _predict_normalized(self, texts:list, batch_size:int) -> np.ndarray:
+        probabilities = np.empty((len(texts),), dtype=np.float32)
+        classifier = self.classifier
+        if self.bucketing and classifier is not None:
+            vectorizer = self.vectorizer
+            # neighbours in length share a batch, which is padded to its own longest text
+            order = np.argsort(np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=len(texts)), kind='stable')
+            for start in range(0, len(texts), batch_size):
+                rows = order[start:start+batch_size]
+                sequences = vectorizer(tf.constant([texts[i] for i in rows])).numpy()
+                length = max(int(np.count_nonzero(sequences, axis=1).max()), 1)
+                probabilities[rows] = np.ravel(classifier.predict_on_batch(sequences[:, :length]))
+            return probabilities
+
+        for start in range(0, len(texts), batch_size):
+            batch = tf.constant(texts[start:start+batch_size])[:, tf.newaxis]
+            probabilities[start:start+batch_size] = np.ravel(self.model.predict_on_batch(batch))
+
+        return probabilities
+
+    def predict_long(self, texts:list, batch_size:int=256, stride:int=None, aggregate:str='max') -> np.ndarray:
+        classifier = self.classifier
+        if classifier is None:
+            raise ValueError("long-document scoring needs a model with a separate classifier")
+        if aggregate not in windows.AGGREGATIONS:
+            raise ValueError(f"unknown aggregation '{aggregate}', expected one of {', '.join(windows.AGGREGATIONS)}")
+        texts = preprocessing.normalize_many(list(texts))
+        window = self.sequence_length
+        if stride is None:
+            stride = window // 2
+        if not 0 < stride <= window:
+            raise ValueError(f"stride must be between 1 and the window of {window} tokens, got {stride}")
+
+        start = time.perf_counter()
+        document_windows, documents = windows.split_windows(self._token_ids(texts), window, stride)
+        lengths = np.fromiter((len(ids) for ids in document_windows), dtype=np.int64, count=len(document_windows))
+        scores = np.empty((len(document_windows),), dtype=np.float32)
+        # windows of all documents share batches; with bucketing, sorting by length keeps the padding of short ones apart
+        order = np.argsort(lengths, kind='stable')
+        for batch_start in range(0, len(order), batch_size):
+            rows = order[batch_start:batch_start+batch_size]
+            batch = windows.pad_windows([document_windows[i] for i in rows], None if self.bucketing else window)
+            scores[rows] = np.ravel(classifier.predict_on_batch(batch))
+        self.windows_scored += len(document_windows)
+        self.window_seconds += time.perf_counter() - start
+
+        return windows.aggregate(scores, documents, lengths, len(texts), aggregate)
+
+    def window_rate(self) -> float:
+        return self.windows_scored / max(self.window_seconds, 1e-9)
+
+    def _token_ids(self, texts:list) -> list:
+        vectorizer = self.vectorizer
+        if isinstance(vectorizer, HashingVectorizer):
+            tokens = [text.split() for text in texts]
+            buckets = word_buckets([token for text_tokens in tokens for token in text_tokens], vectorizer.num_buckets)
+            return np.split(buckets.astype(np.int64), np.cumsum([len(text_tokens) for text_tokens in tokens])[:-1])
+
+        if self._vocabulary is None:
+            self._vocabulary = Vocabulary(vectorizer.get_vocabulary())
+        return [np.array(self._vocabulary.token_ids(text), dtype=np.int64) for text in texts]
+
+    def predict_stream(self, texts, batch_size:int=256):
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                yield from self.predict_batch(batch, batch_size)
+                batch = []
+        if batch:
+            yield from self.predict_batch(batch, batch_size)
+
+    @classmethod
+    def _preprocess(cls, dataset:Dataset, artifacts=True):
+        if artifacts and preprocessing.STAGE_ARTIFACTS not in dataset.stages and preprocessing.STAGE_NORMALIZE not in dataset.stages:
+            dataset.filter_apply(preprocessing.strip_chatgpt_artifacts)
+            dataset.mark(preprocessing.STAGE_ARTIFACTS)
+        if preprocessing.STAGE_NORMALIZE not in dataset.stages:
+            dataset.apply_batch(cls.preprocess_cache.normalize_many)
+            dataset.mark(preprocessing.STAGE_NORMALIZE)
+
+    @classmethod
+    def _create_vectorizer(cls, corpus:Dataset, max_tokens:int=None, min_frequency:int=1, sequence_length:int=200) -> TextVectorization:
+        cls._preprocess(corpus)
+        vocabulary = Vocabulary.build(corpus.get_texts(), max_tokens, min_frequency, workers=os.cpu_count())
+        return cls._vectorizer_from_vocabulary(vocabulary, sequence_length)
+
     @classmethod
-    def _create_vectorizer(cls, corpus:Dataset) -> TextVectorization:
-        corpus.filter(preprocessing.contains_chatgpt_error)
-        corpus.apply(preprocessing.clean_chatgpt_output)
-        corpus.apply(preprocessing.clean)
-        corpus.apply(preprocessing.lowercase)
-        vectorizer = TextVectorization(max_tokens=None, output_mode="int", output_sequence_length=200, standardize=None)
-        corpus_texts = tf.data.Dataset.from_tensor_slices(corpus.get_texts()).batch(128)
-        vectorizer.adapt(corpus_texts)
+    def _vectorizer_from_vocabulary(cls, vocabulary:Vocabulary, sequence_length:int=200) -> TextVectorization:
+        vectorizer = TextVectorization(max_tokens=None, output_mode="int", output_sequence_length=sequence_length, standardize=None)
+        vectorizer.set_vocabulary(vocabulary.tokens)
 
         return vectorizer
     
     @classmethod
     def _create_embedding(cls, filepath:str, vocab:list) -> Embedding:
-        embeddings_index = {}
-        coefs = np.ndarray((0))
-        with open(filepath, encoding="utf8") as f:
-            for line in f:
-                word, coefs = line.split(maxsplit=1)
-                coefs = np.fromstring(coefs, "f", sep=" ")
-                embeddings_index[word] = coefs
-
-        word_index = dict(zip(vocab, range(len(vocab))))
-        num_tokens = len(vocab) + 2
-        embedding_dim = coefs.size
-
-        embedding_matrix = np.zeros((num_tokens, embedding_dim))
-        for word, i in word_index.items():
-            embedding_vector = embeddings_index.get(word)
-            if embedding_vector is not None:
-                embedding_matrix[i] = embedding_vector
+        return cls._embedding_from_matrix(embeddings.embedding_matrix(filepath, vocab))
+
+    @classmethod
+    def _embedding_from_matrix(cls, embedding_matrix:np.ndarray) -> Embedding:
+        num_tokens, embedding_dim = embedding_matrix.shape
         
         embedding = Embedding(
             num_tokens,
@@ -160,11 +485,36 @@ class Model:
 
         return embedding
 
+    @classmethod
+    def _create_hashed_embedding(cls, filepath:str, num_buckets:int) -> Embedding:
+        return cls._embedding_from_matrix(embeddings.hashed_embedding_matrix(filepath, num_buckets, word_buckets))
+
     def _reinitialize_model(self):
-        for l in self.model.layers:
+        self._weights_changed()
+        # submodules reaches the layers nested in the classifier, not only the top level
+        for l in self.model.submodules:
+            if not isinstance(l, keras.layers.Layer):
+                continue
             if hasattr(l,"kernel_initializer"):
                 l.kernel.assign(l.kernel_initializer(tf.shape(l.kernel)))
             if hasattr(l,"bias_initializer"):
                 l.bias.assign(l.bias_initializer(tf.shape(l.bias)))
             if hasattr(l,"recurrent_initializer"):
-                l.recurrent_kernel.assign(l.recurrent_initializer(tf.shape(l.recurrent_kernel)))
\ No newline at end of file
+                l.recurrent_kernel.assign(l.recurrent_initializer(tf.shape(l.recurrent_kernel)))
+
+def _train_fold(model_path:str, fold:int, test_data:Dataset, train_data:Dataset, batch_size:int, epochs:int, seed:int=None, callbacks=None):
+    if seed is not None:
+        keras.utils.set_random_seed(seed + fold)
+
+    model = Model.load(model_path)
+    model._reinitialize_model()
+    model.train(dataset=train_data, batch_size=batch_size, epochs=epochs, callbacks=callbacks)
+    return model.test(test_data)
+
+def _kfold_worker(model_path:str, fold:int, test_data:Dataset, train_data:Dataset, batch_size:int, epochs:int, threads:int, seed:int=None):
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    if seed is not None:
+        tf.config.experimental.enable_op_determinism()
+
+    return _train_fold(model_path, fold, test_data, train_data, batch_size, epochs, seed)
@@ -1,5 +1,10 @@
+import codecs
 import re
 
+PIPELINE_VERSION = 1
+STAGE_ARTIFACTS = 'artifacts'
+STAGE_NORMALIZE = 'normalize'
+
 def clean(text:str) -> str:
     text = text.replace("\\n", " ")
     text = re.sub(r"[^A-Za-z0-9(),!?\'\`]", " ", text)
@@ -19,19 +24,137 @@ def clean(text:str) -> str:
 def lowercase(text: str) -> str:
     return text.lower()
 
+# UI boilerplate left in scraped ChatGPT answers. The page signature used to be matched with
+# "New chat(?:.|\s)*...Log out$", which backtracks quadratically on long pages without the footer;
+# every signature is now located with str.find/startswith/endswith, so a scan is linear in the text.
+_ALLOWED_CHARACTERS = re.compile(r"[A-Za-z0-9(),!?\'\`]")
+_PAGE_HEADER = "ChatGPT Dec 15 Version. Free Research Preview. Our goal is to make AI systems more natural and safe to interact with. Your feedback will help us improve.\r\nNew chat"
+_PAGE_FOOTER = "\r\nDark mode\r\nOpenAI Discord\r\nUpdates & FAQ\r\nLog out"
+_REGENERATE = "Regenerate response"
+_POLICY_PREFIX = "Contents may violate our content policy"
+_POLICY_NOTICE = "This content may violate our content policy. If you believe this to be in error, please submit your feedback \u2014 your input will aid our research in this area."
+_ONLY_ONE_MESSAGE_ERROR = re.compile(r"!\s*Only one message at a time\. Please allow any other responses to complete before sending another message, or wait one minute\.\s*There was an error generating a response")
+_NETWORK_ERROR = re.compile(r"!(?:, |\s)*?network error(?:, |\s)*?There was an error generating a response")
+
+def _page_footer_start(text:str):
+    # where "...Log out$" matches: at the very end, or before a single trailing newline
+    if text.endswith(_PAGE_FOOTER):
+        return len(text) - len(_PAGE_FOOTER)
+    if text.endswith(_PAGE_FOOTER + "\n"):
+        return len(text) - len(_PAGE_FOOTER) - 1
+    return None
+
+def _strip_crlf_before(text:str, end:int, start:int) -> int:
+    while end - 2 >= start and text.startswith("\r\n", end - 2):
+        end -= 2
+    return end
+
+def _remove_regenerate(text:str) -> str:
+    parts = []
+    position = 0
+    found = text.find(_REGENERATE)
+    while found >= 0:
+        start = _strip_crlf_before(text, found, position)
+        if start < found:
+            parts.append(text[position:start])
+            position = found + len(_REGENERATE)
+        found = text.find(_REGENERATE, found + len(_REGENERATE))
+    if not parts:
+        return text
+    parts.append(text[position:])
+    return "".join(parts)
+
+def _remove_policy_notice(text:str) -> str:
+    parts = []
+    position = 0
+    found = text.find(_POLICY_NOTICE)
+    while found >= 0:
+        start = found
+        prefix_end = _strip_crlf_before(text, found, position)
+        if prefix_end - len(_POLICY_PREFIX) >= position and text.startswith(_POLICY_PREFIX, prefix_end - len(_POLICY_PREFIX)):
+            start = prefix_end - len(_POLICY_PREFIX)
+        parts.append(text[position:start])
+        position = found + len(_POLICY_NOTICE)
+        found = text.find(_POLICY_NOTICE, position)
+    if not parts:
+        return text
+    parts.append(text[position:])
+    return "".join(parts)
+
+def scan_chatgpt_output(text:str) -> tuple:
+    footer = _page_footer_start(text)
+    first_allowed = _ALLOWED_CHARACTERS.search(text)
+    is_error = (
+        (footer is not None and first_allowed is not None
+            and text.startswith(_PAGE_HEADER, first_allowed.start())
+            and footer >= first_allowed.start() + len(_PAGE_HEADER))
+        or _ONLY_ONE_MESSAGE_ERROR.match(text) is not None
+        or _NETWORK_ERROR.match(text) is not None
+    )
+
+    if text.startswith("!"):
+        text = text[1:]
+    if _REGENERATE in text:
+        text = _remove_regenerate(text)
+    if _POLICY_NOTICE in text:
+        text = _remove_policy_notice(text)
+    footer = _page_footer_start(text)
+    if footer is not None:
+        header = text.find(_PAGE_HEADER)
+        if 0 <= header and header + len(_PAGE_HEADER) <= footer:
+            text = text[:header] + text[footer + len(_PAGE_FOOTER):]
+    return is_error, text
+
 def contains_chatgpt_error(text:str) -> bool:
-    if re.match(r"^[^A-Za-z0-9(),!?\'\`]*?ChatGPT Dec 15 Version\. Free Research Preview\. Our goal is to make AI systems more natural and safe to interact with\. Your feedback will help us improve\.\r\nNew chat(?:.|\s)*\r\nDark mode\r\nOpenAI Discord\r\nUpdates & FAQ\r\nLog out$", text):
-        return True
-    if re.match(r"^!\s*Only one message at a time\. Please allow any other responses to complete before sending another message, or wait one minute\.\s*There was an error generating a response", text):
-        return True
-    if re.match(r"^!(?:, |\s)*?network error(?:, |\s)*?There was an error generating a response", text):
-        return True
-    
-    return False
+    return scan_chatgpt_output(text)[0]
 
 def clean_chatgpt_output(text:str) -> str:
-    text = re.sub(r"^!", "", text)
-    text = re.sub(r"(?:\r\n)+Regenerate response", "", text)
-    text = re.sub(r"(?:Contents may violate our content policy(?:\r\n)*)?This content may violate our content policy\. If you believe this to be in error, please submit your feedback \u2014 your input will aid our research in this area\.", "", text)
-    text = re.sub(r"ChatGPT Dec 15 Version\. Free Research Preview\. Our goal is to make AI systems more natural and safe to interact with\. Your feedback will help us improve\.\r\nNew chat(?:.|\s)*\r\nDark mode\r\nOpenAI Discord\r\nUpdates & FAQ\r\nLog out$", "", text)
-    return text
\ No newline at end of file
+    return scan_chatgpt_output(text)[1]
+
+def strip_chatgpt_artifacts(text:str):
+    is_error, text = scan_chatgpt_output(text)
+    return None if is_error else text
+
+# Fused equivalent of lowercase(clean(text)). Every rule of clean() only keeps or pads ASCII
+# characters, so the text is encoded once (non-ASCII code points become single spaces) and the
+# character filter and lowercasing collapse into one bytes.translate() table.
+_BATCH_SEPARATOR = '\x00'
+_BATCH_CHUNK = 64
+_CONTRACTIONS = [(b"'s", b" 's"), (b"'ve", b" 've"), (b"n't", b" n't"), (b"'re", b" 're"), (b"'d", b" 'd"), (b"'ll", b" 'll")]
+_PUNCTUATION = [(b",", b" , "), (b"!", b" ! "), (b"(", b" ( "), (b")", b" ) "), (b"?", b" ? ")]
+_NORMALIZE_TABLE = bytes(
+    ord(chr(c).lower()) if chr(c) in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789(),!?'`" else ord(' ')
+    for c in range(256)
+)
+_BATCH_NORMALIZE_TABLE = bytearray(_NORMALIZE_TABLE)
+_BATCH_NORMALIZE_TABLE[ord(_BATCH_SEPARATOR)] = ord(_BATCH_SEPARATOR)
+_BATCH_NORMALIZE_TABLE = bytes(_BATCH_NORMALIZE_TABLE)
+
+codecs.register_error('normalize_space', lambda error: (' ' * (error.end - error.start), error.end))
+
+def _normalize(text:str, table:bytes) -> str:
+    data = text.encode('ascii', 'normalize_space').replace(b"\\n", b" ")
+    if b"'" in data:
+        for old, new in _CONTRACTIONS:
+            data = data.replace(old, new)
+    data = data.translate(table)
+    for old, new in _PUNCTUATION:
+        data = data.replace(old, new)
+    return data.decode('ascii')
+
+def normalize(text:str) -> str:
+    return _normalize(text, _NORMALIZE_TABLE)
+
+def normalize_many(texts:list) -> list:
+    if any(_BATCH_SEPARATOR in text for text in texts):
+        return [normalize(text) for text in texts]
+
+    normalized = []
+    for start in range(0, len(texts), _BATCH_CHUNK):
+        chunk = _BATCH_SEPARATOR.join(texts[start:start+_BATCH_CHUNK])
+        normalized.extend(_normalize(chunk, _BATCH_NORMALIZE_TABLE).split(_BATCH_SEPARATOR))
+    return normalized
+
+def prepare_training_text(text:str):
+    text = strip_chatgpt_artifacts(text)
+    return None if text is None else normalize(text)
@@ -0,0 +1,171 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+import time
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+class Overloaded(Exception):
+    pass
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size:int=64, max_wait:float=0.005, max_queue:int=1024):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # one inference thread: batches are serialized, the event loop stays free for I/O
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.batched_texts = 0
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def submit(self, texts:list) -> list:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((texts, future))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            n_texts = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_texts < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n_texts += len(item[0])
+
+            items = [(texts, future) for texts, future in items if not future.done()]
+            if not items:
+                continue
+            texts = [text for item_texts, _ in items for text in item_texts]
+            try:
+                probabilities = await loop.run_in_executor(self.executor, self.predict_batch, texts)
+            except Exception as error:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(texts)
+            start = 0
+            for item_texts, future in items:
+                if not future.done():
+                    future.set_result([float(p) for p in probabilities[start:start+len(item_texts)]])
+                start += len(item_texts)
+
+class ScoringServer:
+    def __init__(self, batcher:MicroBatcher, timeout:float=5.0, max_body:int=16 << 20):
+        self.batcher = batcher
+        self.timeout = timeout
+        self.max_body = max_body
+        self.started = time.time()
+        self.requests = 0
+
+    async def serve(self, host:str, port:int):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'Listening on http://{host}:{port}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method:str, target:str, body:bytes):
+        if method == 'GET' and target == '/health':
+            return 200, {
+                'status': 'ok',
+                'uptime': time.time() - self.started,
+                'requests': self.requests,
+                'queued': self.batcher.queue.qsize(),
+                'batches': self.batcher.batches,
+                'mean_batch_size': self.batcher.batched_texts / max(self.batcher.batches, 1),
+            }
+        if method != 'POST' or target != '/score':
+            return 404, {'error': 'use POST /score or GET /health'}
+
+        try:
+            request = json.loads(body)
+            single = 'text' in request
+            texts = [request['text']] if single else request['texts']
+            if not all(isinstance(text, str) for text in texts):
+                raise TypeError()
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': 'expected {"text": str} or {"texts": [str, ...]}'}
+
+        self.requests += 1
+        try:
+            probabilities = await asyncio.wait_for(self.batcher.submit(texts), self.timeout)
+        except Overloaded:
+            return 503, {'error': 'server overloaded, retry later'}
+        except asyncio.TimeoutError:
+            return 504, {'error': f'no result within {self.timeout}s'}
+        except Exception as error:
+            # raised by predict_batch and passed on by the batcher to every request of the batch
+            print(f'Scoring failed: {error!r}', file=sys.stderr, flush=True)
+            return 500, {'error': 'scoring failed'}
+
+        if single:
+            return 200, {'probability': probabilities[0]}
+        return 200, {'probabilities': probabilities}
+
+    async def respond(self, writer:asyncio.StreamWriter, status:int, payload:dict, keep_alive=True):
+        body = json.dumps(payload).encode('utf8')
+        head = (
+            f'HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+def run(predict_batch, host:str='127.0.0.1', port:int=8080, max_batch_size:int=64, max_wait:float=0.005, max_queue:int=1024, timeout:float=5.0):
+    async def main():
+        batcher = MicroBatcher(predict_batch, max_batch_size, max_wait, max_queue)
+        await ScoringServer(batcher, timeout).serve(host, port)
+
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+LEADERBOARD_FIELDS = ['trial', 'filters', 'kernel_sizes', 'dropout', 'epochs', 'accuracy', 'f1', 'train_seconds', 'latency_ms']
+
+def prepare_shared(shared_dir:str, dataset_path:str, embeddings_path:str, sequence_length:int=200, validation_split:float=0.2, max_tokens:int=None, min_frequency:int=1, balancing=False):
+    # everything a trial needs is computed once and memory-mapped by the workers
+    import embeddings
+    from dataset import Dataset, permutation
+    from model import Model
+    from vocabulary import Vocabulary
+
+    dataset = Dataset.from_json(dataset_path, balancing=balancing)
+    Model._preprocess(dataset)
+    texts = dataset.get_texts()
+    vocabulary = Vocabulary.build(texts, max_tokens, min_frequency, workers=os.cpu_count())
+    labels = dataset.get_labels()
+    order = permutation(len(labels))
+    n_validation = int(validation_split * len(labels))
+
+    vocabulary.save(os.path.join(shared_dir, 'vocab.txt'))
+    np.save(os.path.join(shared_dir, 'sequences.npy'), vocabulary.encode(texts, sequence_length))
+    np.save(os.path.join(shared_dir, 'labels.npy'), labels)
+    np.save(os.path.join(shared_dir, 'validation.npy'), order[:n_validation])
+    np.save(os.path.join(shared_dir, 'train.npy'), order[n_validation:])
+    np.save(os.path.join(shared_dir, 'embedding.npy'), embeddings.embedding_matrix(embeddings_path, vocabulary.tokens))
+
+def sequence_pipeline(sequences:np.ndarray, labels:np.ndarray, batch_size:int, sequence_length:int, shuffle=False):
+    import tensorflow as tf
+    from dataset import bucket_boundaries, trim_padding
+
+    data = tf.data.Dataset.from_tensor_slices((sequences, labels))
+    if shuffle:
+        data = data.shuffle(len(labels))
+    data = data.map(lambda x, y: (trim_padding(x), y))
+    boundaries = bucket_boundaries(sequence_length)
+    data = data.bucket_by_sequence_length(lambda x, y: tf.shape(x)[0], boundaries, [batch_size] * (len(boundaries) + 1))
+    return data.prefetch(tf.data.AUTOTUNE)
+
+def build_classifier(shared_dir:str, config:dict):
+    from model import Model
+
+    embedding = Model._embedding_from_matrix(np.load(os.path.join(shared_dir, 'embedding.npy')))
+    classifier = Model._create_classifier(embedding, config['filters'], config['kernel_sizes'], config['dropout'])
+    Model._compile(classifier)
+    return classifier
+
+def run_trial(shared_dir:str, config:dict, epochs:int, initial_epoch:int, weights_path:str, batch_size:int, seed:int=None) -> dict:
+    from tensorflow import keras
+    from evaluation import StreamingEvaluator
+
+    if seed is not None:
+        keras.utils.set_random_seed(seed + config['trial'])
+    sequences = np.load(os.path.join(shared_dir, 'sequences.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(shared_dir, 'labels.npy'))
+    train = np.load(os.path.join(shared_dir, 'train.npy'))
+    validation = np.sort(np.load(os.path.join(shared_dir, 'validation.npy')))
+    sequence_length = sequences.shape[1]
+
+    classifier = build_classifier(shared_dir, config)
+    if initial_epoch:
+        classifier.load_weights(weights_path)
+
+    start = time.perf_counter()
+    train_data = sequence_pipeline(sequences[train], labels[train], batch_size, sequence_length, shuffle=True)
+    classifier.fit(train_data, epochs=epochs, initial_epoch=initial_epoch, verbose=0)
+    train_seconds = time.perf_counter() - start
+    classifier.save_weights(weights_path)
+
+    validation_data = sequence_pipeline(sequences[validation], labels[validation], 256, sequence_length)
+    evaluator = StreamingEvaluator()
+    start = time.perf_counter()
+    for x, y in validation_data:
+        evaluator.update(classifier.predict_on_batch(x), y.numpy())
+    latency = (time.perf_counter() - start) / max(len(validation), 1)
+    _, accuracy, _, _, fscore = evaluator.scores()
+
+    return {
+        'accuracy': accuracy,
+        'f1': fscore,
+        'train_seconds': train_seconds,
+        'latency_ms': latency * 1e3,
+    }
+
+def _trial_worker(shared_dir:str, config:dict, epochs:int, initial_epoch:int, weights_path:str, batch_size:int, threads:int, seed:int=None) -> dict:
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    return run_trial(shared_dir, config, epochs, initial_epoch, weights_path, batch_size, seed)
+
+def grid(filters:list, kernel_sizes:list, dropouts:list) -> list:
+    return [
+        {'trial': i, 'filters': n_filters, 'kernel_sizes': sizes, 'dropout': dropout}
+        for i, (n_filters, sizes, dropout) in enumerate(itertools.product(filters, kernel_sizes, dropouts))
+    ]
+
+def successive_halving(shared_dir:str, configs:list, min_epochs:int, max_epochs:int, eta:int=3, batch_size:int=32, workers:int=1, metric:str='f1', seed:int=None) -> list:
+    records = {config['trial']: dict(config, epochs=0, train_seconds=0.0) for config in configs}
+    survivors = [config['trial'] for config in configs]
+    epochs = min_epochs
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) if workers > 1 else None
+
+    try:
+        while True:
+            print(f'{len(survivors)} configurations, training to epoch {epochs}', file=sys.stderr)
+            jobs = {}
+            for trial in survivors:
+                weights_dir = os.path.join(shared_dir, f'trial-{trial}')
+                os.makedirs(weights_dir, exist_ok=True)
+                jobs[trial] = (shared_dir, records[trial], epochs, records[trial]['epochs'], os.path.join(weights_dir, 'weights'), batch_size)
+
+            if executor is not None:
+                futures = {trial: executor.submit(_trial_worker, *job, threads, seed) for trial, job in jobs.items()}
+                results = {trial: future.result() for trial, future in futures.items()}
+            else:
+                results = {trial: run_trial(*job, seed) for trial, job in jobs.items()}
+            for trial, result in results.items():
+                result['train_seconds'] += records[trial]['train_seconds']
+                records[trial].update(result, epochs=epochs)
+
+            if epochs >= max_epochs or len(survivors) <= 1:
+                break
+            # keep the best 1/eta of the rung and give them eta times the budget
+            survivors = sorted(survivors, key=lambda trial: records[trial][metric], reverse=True)[:max(1, len(survivors) // eta)]
+            epochs = min(epochs * eta, max_epochs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return sorted(records.values(), key=lambda record: (record['epochs'], record[metric]), reverse=True)
+
+def write_leaderboard(path:str, records:list):
+    with (sys.stdout if path == '-' else open(path, mode='w', encoding='utf8', newline='')) as output_file:
+        writer = csv.DictWriter(output_file, LEADERBOARD_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, kernel_sizes=','.join(map(str, record['kernel_sizes']))))
+
+def save_best(path:str, shared_dir:str, record:dict):
+    from model import Model
+    from vocabulary import Vocabulary
+
+    classifier = build_classifier(shared_dir, record)
+    classifier.load_weights(os.path.join(shared_dir, f"trial-{record['trial']}", 'weights'))
+    sequence_length = np.load(os.path.join(shared_dir, 'sequences.npy'), mmap_mode='r').shape[1]
+    vectorizer = Model._vectorizer_from_vocabulary(Vocabulary.load(os.path.join(shared_dir, 'vocab.txt')), sequence_length)
+    Model.from_classifier(vectorizer, classifier).save(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with successive halving")
+    parser.add_argument('dataset', help="HC3-style JSONL file")
+    parser.add_argument('embeddings', help="GloVe-style text file")
+    parser.add_argument('--filters', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--kernel-sizes', nargs='+', default=['3,4,5'], help="comma-separated kernel sizes per configuration")
+    parser.add_argument('--dropout', type=float, nargs='+', default=[0.2, 0.5])
+    parser.add_argument('--min-epochs', type=int, default=1)
+    parser.add_argument('--max-epochs', type=int, default=9)
+    parser.add_argument('--eta', type=int, default=3, help="keep 1/eta of the configurations after each rung")
+    parser.add_argument('--metric', choices=['accuracy', 'f1'], default='f1')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--sequence-length', type=int, default=200)
+    parser.add_argument('--validation-split', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=1, help="trials trained in parallel processes")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--balancing', action='store_true')
+    parser.add_argument('-o', '--output', default='-', help="leaderboard CSV, '-' for stdout")
+    parser.add_argument('--save-best', help="save the best configuration as a model directory")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        import random
+        random.seed(args.seed)
+    kernel_sizes = [[int(size) for size in sizes.split(',') if size] for sizes in args.kernel_sizes]
+    configs = grid(args.filters, kernel_sizes, args.dropout)
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        start = time.perf_counter()
+        prepare_shared(shared_dir, args.dataset, args.embeddings, args.sequence_length, args.validation_split, balancing=args.balancing)
+        print(f'Shared preprocessing in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+        records = successive_halving(
+            shared_dir, configs, args.min_epochs, args.max_epochs, args.eta, args.batch_size, args.workers, args.metric, args.seed
+        )
+        write_leaderboard(args.output, records)
+        if args.save_best:
+            save_best(args.save_best, shared_dir, records[0])
+            print(f'Best configuration saved to {args.save_best}', file=sys.stderr)
+        print(f'{len(configs)} configurations in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import threading
+import traceback
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+class Cancelled(Exception):
+    pass
+
+class TaskSignals(QObject):
+    progress = Signal(int, str)
+    telemetry = Signal(object)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+class Task:
+    # func(task, *args) runs on a pool thread; it reports progress and reaches cancellation points through the task
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise Cancelled()
+
+    def emit_progress(self, done:int, total:int=100, message:str=""):
+        self.signals.progress.emit(int(100 * done / max(total, 1)), message)
+
+    def report(self, done:int, total:int=100, message:str=""):
+        self.check()
+        self.emit_progress(done, total, message)
+
+    def run(self):
+        try:
+            self.check()
+            result = self.func(self, *self.args, **self.kwargs)
+            self.check()
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            traceback.print_exc()
+            self.signals.failed.emit(str(error))
+        else:
+            self.signals.finished.emit(result)
+
+class _Runnable(QRunnable):
+    # owned and deleted by the pool, callers only ever hold the Task
+    def __init__(self, task:Task):
+        super(_Runnable, self).__init__()
+        self.task = task
+
+    def run(self):
+        self.task.run()
+
+class TaskManager(QObject):
+    def __init__(self, max_workers:int=None):
+        super(TaskManager, self).__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_workers or max(2, min(4, os.cpu_count() or 1)))
+        self.tasks = set()
+
+    def start(self, task:Task) -> Task:
+        # connect to task.signals before starting, a short task can finish before the next line runs
+        self.tasks.add(task)
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(lambda *_, task=task: self.tasks.discard(task))
+        self.pool.start(_Runnable(task))
+        return task
+
+    def cancel_all(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    def wait(self, msecs:int=-1) -> bool:
+        return self.pool.waitForDone(msecs)
+
+_manager = None
+
+def manager() -> TaskManager:
+    global _manager
+    if _manager is None:
+        _manager = TaskManager()
+    return _manager
+
+def keras_callback(task:Task, epochs:int):
+    from tensorflow import keras
+
+    # raising out of fit() leaves the input pipeline half torn down, so cancellation only stops training
+    class TaskCallback(keras.callbacks.Callback):
+        def on_train_batch_end(self, batch, logs=None):
+            if task.is_cancelled():
+                self.model.stop_training = True
+
+        def on_epoch_end(self, epoch, logs=None):
+            if task.is_cancelled():
+                self.model.stop_training = True
+            else:
+                task.emit_progress(epoch + 1, epochs, f'Epoch {epoch + 1}/{epochs}')
+
+    return TaskCallback()
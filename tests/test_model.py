@@ -0,0 +1,49 @@
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+import numpy as np
+
+from model import Model
+from vocabulary import Vocabulary
+
+WORDS = ["the", "model", "answer", "is", "a", "long", "text", "with", "many", "words"]
+
+@pytest.fixture
+def model():
+    tf.keras.utils.set_random_seed(0)
+    vocabulary = Vocabulary(["", "[UNK]"] + WORDS)
+    vectorizer = Model._vectorizer_from_vocabulary(vocabulary, sequence_length=32)
+    matrix = np.random.default_rng(0).normal(size=(len(vocabulary), 8)).astype(np.float32)
+    matrix[0] = 0
+    classifier = Model._create_classifier(Model._embedding_from_matrix(matrix), 4, [3, 5], 0.5)
+    for layer in classifier.layers:
+        if isinstance(layer, tf.keras.layers.Conv1D):
+            # positive biases would leak into the max of every padded position
+            layer.bias.assign(tf.fill(tf.shape(layer.bias), 1.0))
+    return Model.from_classifier(vectorizer, classifier, "test")
+
+def test_prediction_does_not_depend_on_batch_neighbours(model):
+    assert model.bucketing
+    text = "the model answer"
+    neighbour = " ".join(WORDS * 3)
+
+    alone = model.predict_batch([text])
+    with_neighbour = model.predict_batch([text, neighbour])
+    fixed = model.model.predict_on_batch(tf.constant([[text]]))
+
+    np.testing.assert_allclose(alone[0], with_neighbour[0], rtol=1e-6)
+    np.testing.assert_allclose(alone[0], np.ravel(fixed)[0], rtol=1e-6)
+
+def test_loaded_model_keeps_bucketing(model, tmp_path):
+    path = str(tmp_path / "model")
+    model.save(path)
+    assert Model.load(path).bucketing
+
+def test_reinitialize_resets_nested_classifier_weights(model):
+    layers = [layer for layer in model.classifier.layers if isinstance(layer, (tf.keras.layers.Conv1D, tf.keras.layers.Dense))]
+    before = [layer.kernel.numpy() for layer in layers]
+
+    model._reinitialize_model()
+
+    for layer, kernel in zip(layers, before):
+        assert not np.array_equal(layer.kernel.numpy(), kernel)
@@ -0,0 +1,63 @@
+import random
+import re
+import time
+import pytest
+
+import preprocessing
+from benchmark import adversarial_texts, synthetic_texts
+
+# the regexes scan_chatgpt_output replaced, kept as the reference behaviour for the fuzzer; (?:.|\s)* is
+# exponential on whitespace runs, so it is spelled as the equivalent [\s\S]* to keep the reference usable
+LEGACY_ERROR_PATTERNS = [
+    r"^[^A-Za-z0-9(),!?\'\`]*?ChatGPT Dec 15 Version\. Free Research Preview\. Our goal is to make AI systems more natural and safe to interact with\. Your feedback will help us improve\.\r\nNew chat[\s\S]*\r\nDark mode\r\nOpenAI Discord\r\nUpdates & FAQ\r\nLog out$",
+    r"^!\s*Only one message at a time\. Please allow any other responses to complete before sending another message, or wait one minute\.\s*There was an error generating a response",
+    r"^!(?:, |\s)*?network error(?:, |\s)*?There was an error generating a response",
+]
+LEGACY_CLEAN_PATTERNS = [
+    r"^!",
+    r"(?:\r\n)+Regenerate response",
+    r"(?:Contents may violate our content policy(?:\r\n)*)?This content may violate our content policy\. If you believe this to be in error, please submit your feedback — your input will aid our research in this area\.",
+    r"ChatGPT Dec 15 Version\. Free Research Preview\. Our goal is to make AI systems more natural and safe to interact with\. Your feedback will help us improve\.\r\nNew chat[\s\S]*\r\nDark mode\r\nOpenAI Discord\r\nUpdates & FAQ\r\nLog out$",
+]
+ARTIFACT_FRAGMENTS = [
+    preprocessing._PAGE_HEADER, preprocessing._PAGE_FOOTER, preprocessing._REGENERATE, preprocessing._POLICY_PREFIX,
+    preprocessing._POLICY_NOTICE, "New chat", "Log out", "network error", "There was an error generating a response",
+    "Only one message at a time. Please allow any other responses to complete before sending another message, or wait one minute.",
+    "!", ", ", " ", "\r\n", "\n", "\r", "\t", "answer", "...", "—",
+]
+
+def legacy_scan(text:str) -> tuple:
+    is_error = any(re.match(pattern, text) for pattern in LEGACY_ERROR_PATTERNS)
+    for pattern in LEGACY_CLEAN_PATTERNS:
+        text = re.sub(pattern, "", text)
+    return is_error, text
+
+def best_time(func, *args, repeat:int=3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def test_scan_matches_legacy_regexes():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choices(ARTIFACT_FRAGMENTS, k=rng.randint(0, 12)))
+        assert preprocessing.scan_chatgpt_output(text) == legacy_scan(text), text
+
+@pytest.mark.parametrize('name', list(adversarial_texts(0)))
+def test_scan_is_linear_on_adversarial_pages(name):
+    text = adversarial_texts(200000)[name]
+    small = text[:len(text) // 10]
+    per_char_small = best_time(preprocessing.scan_chatgpt_output, small) / len(small)
+    elapsed = best_time(preprocessing.scan_chatgpt_output, text)
+    # a backtracking scan grows ~10x per character over a 10x longer input
+    assert elapsed < 2.0
+    assert elapsed / len(text) / per_char_small < 5.0
+
+def test_normalize_matches_clean_and_lowercase():
+    texts = synthetic_texts(2000, words=50) + ["", "\\n", "It's\tdon't\r\n(yes)", "café “quoted” \U0001f600"]
+    expected = [preprocessing.lowercase(preprocessing.clean(text)) for text in texts]
+    assert [preprocessing.normalize(text) for text in texts] == expected
+    assert preprocessing.normalize_many(texts) == expected
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+from server import MicroBatcher, ScoringServer
+
+def score(predict_batch, body:dict) -> tuple:
+    async def main():
+        batcher = MicroBatcher(predict_batch, max_wait=0)
+        batcher.start()
+        try:
+            return await ScoringServer(batcher).dispatch('POST', '/score', json.dumps(body).encode('utf8'))
+        finally:
+            batcher.task.cancel()
+
+    return asyncio.run(main())
+
+def test_scores_texts():
+    status, payload = score(lambda texts: [0.25] * len(texts), {'texts': ['a', 'b']})
+    assert status == 200
+    assert payload == {'probabilities': [0.25, 0.25]}
+
+def test_failed_prediction_is_a_server_error():
+    def predict_batch(texts):
+        raise RuntimeError('model failed')
+
+    status, payload = score(predict_batch, {'text': 'a'})
+    assert status == 500
+    assert 'error' in payload
@@ -0,0 +1,34 @@
+import json
+import os
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from dataset import Dataset
+from training import STATE_FILE, TrainingControl
+
+def make_dataset(texts:list) -> Dataset:
+    return Dataset([{'text': text, 'label': i % 2} for i, text in enumerate(texts)])
+
+def finish_run(control:TrainingControl, epochs:int):
+    with open(os.path.join(control.checkpoint_dir, STATE_FILE), mode='w', encoding='utf8') as state_file:
+        json.dump(dict(control.run, epoch=epochs), state_file)
+
+def test_resume_keeps_validation_texts_across_shuffles(tmp_path):
+    texts = [f'text {i}' for i in range(50)]
+    control = TrainingControl(validation_split=0.2, checkpoint_dir=str(tmp_path))
+    _, validation = control.split(make_dataset(texts), 3)
+    finish_run(control, 1)
+
+    resumed = TrainingControl(validation_split=0.2, checkpoint_dir=str(tmp_path))
+    _, resumed_validation = resumed.split(make_dataset(texts), 3)
+    assert sorted(resumed_validation.get_texts()) == sorted(validation.get_texts())
+
+@pytest.mark.parametrize('texts, epochs', [([f'other {i}' for i in range(50)], 3), ([f'text {i}' for i in range(50)], 5)])
+def test_resume_refuses_a_different_run(tmp_path, texts, epochs):
+    control = TrainingControl(validation_split=0.2, checkpoint_dir=str(tmp_path))
+    control.split(make_dataset([f'text {i}' for i in range(50)]), 3)
+    finish_run(control, 3)
+
+    with pytest.raises(ValueError):
+        TrainingControl(validation_split=0.2, checkpoint_dir=str(tmp_path)).split(make_dataset(texts), epochs)
@@ -0,0 +1,10 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from vocabulary import corpus_fingerprint
+
+def test_corpus_fingerprint_ignores_text_order():
+    texts = ['a b c', 'b c', 'c', 'a b c']
+    assert corpus_fingerprint(texts) == corpus_fingerprint(texts[::-1])
+    assert corpus_fingerprint(texts) != corpus_fingerprint(texts[:-1])
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import constants
+from dataset import Dataset, permutation
+
+STATE_FILE = 'state.json'
+SPLIT_FILE = 'validation_digests.npy'
+BEST_WEIGHTS_FILE = 'best_weights.npz'
+
+def checkpoint_dir(name:str) -> str:
+    return os.path.join(constants.CHECKPOINT_DIR, name)
+
+def read_state(directory:str):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, mode='r', encoding='utf8') as state_file:
+        return json.load(state_file)
+
+class EarlyStopping(keras.callbacks.EarlyStopping):
+    # keras only restores the best weights when it stops early; here they are restored at the end of every run,
+    # and the monitor state can be carried over from a checkpoint
+    def __init__(self, resume_state:dict=None, **kwargs):
+        super(EarlyStopping, self).__init__(restore_best_weights=True, **kwargs)
+        self.resume_state = resume_state
+
+    def on_train_begin(self, logs=None):
+        super(EarlyStopping, self).on_train_begin(logs)
+        if self.resume_state:
+            self.best = self.resume_state['best']
+            self.best_epoch = self.resume_state['best_epoch']
+            self.wait = self.resume_state['wait']
+            self.stopped_epoch = self.resume_state['stopped_epoch']
+            self.best_weights = self.resume_state.get('best_weights')
+
+    def state(self) -> dict:
+        return {'best': float(self.best), 'best_epoch': self.best_epoch, 'wait': self.wait, 'stopped_epoch': self.stopped_epoch}
+
+    def on_train_end(self, logs=None):
+        super(EarlyStopping, self).on_train_end(logs)
+        if self.best_weights is not None:
+            self.model.set_weights(self.best_weights)
+
+class TimeLimit(keras.callbacks.Callback):
+    def __init__(self, seconds:float):
+        super(TimeLimit, self).__init__()
+        self.seconds = seconds
+        self.timed_out = False
+
+    def on_train_begin(self, logs=None):
+        self.start = time.perf_counter()
+        self.epoch_start = self.start
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        if time.perf_counter() - self.start >= self.seconds:
+            self._stop()
+
+    def on_epoch_end(self, epoch, logs=None):
+        # stop before an epoch that would not fit in the remaining budget
+        now = time.perf_counter()
+        if now + (now - self.epoch_start) - self.start > self.seconds:
+            self._stop()
+
+    def _stop(self):
+        self.timed_out = True
+        self.model.stop_training = True
+
+class Checkpoints(keras.callbacks.Callback):
+    def __init__(self, directory:str, every:int=1, keep:int=2, early_stopping:EarlyStopping=None, run:dict=None):
+        super(Checkpoints, self).__init__()
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.early_stopping = early_stopping
+        self.run = run or {}
+        self.manager = None
+        self.saved_best_epoch = None
+
+    def _checkpoint_manager(self):
+        if self.manager is None:
+            checkpoint = tf.train.Checkpoint(model=self.model, optimizer=self.model.optimizer)
+            self.manager = tf.train.CheckpointManager(checkpoint, self.directory, max_to_keep=self.keep)
+        return self.manager
+
+    def restore(self, model:keras.Model) -> dict:
+        # weights and optimizer slots of the last saved epoch
+        self.model = model
+        state = read_state(self.directory)
+        if state is not None:
+            self._checkpoint_manager().checkpoint.restore(self.manager.latest_checkpoint).assert_existing_objects_matched()
+            self.saved_best_epoch = state.get('early_stopping', {}).get('best_epoch')
+        return state
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.every == 0 or self.model.stop_training:
+            self.save(epoch + 1)
+
+    def save(self, epoch:int):
+        os.makedirs(self.directory, exist_ok=True)
+        self._checkpoint_manager().save(checkpoint_number=epoch)
+        state = dict(self.run, epoch=epoch)
+        if self.early_stopping is not None:
+            state['early_stopping'] = self.early_stopping.state()
+            if self.early_stopping.best_weights is not None and self.early_stopping.best_epoch != self.saved_best_epoch:
+                np.savez(os.path.join(self.directory, BEST_WEIGHTS_FILE), *self.early_stopping.best_weights)
+                self.saved_best_epoch = self.early_stopping.best_epoch
+        # the state file is replaced last, so a crash mid-save resumes from the previous checkpoint
+        tmp = os.path.join(self.directory, STATE_FILE + '.tmp')
+        with open(tmp, mode='w', encoding='utf8') as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp, os.path.join(self.directory, STATE_FILE))
+
+class TrainingControl:
+    def __init__(self, validation_split:float=0.0, patience:int=None, min_delta:float=0.0, checkpoint_dir:str=None, checkpoint_every:int=1, time_limit:float=None, resume=True):
+        self.validation_split = validation_split
+        self.patience = patience
+        self.min_delta = min_delta
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.time_limit = time_limit
+        self.resume = resume
+        self.initial_epoch = 0
+        self.finished = False
+        self.early_stopping = None
+        self.time_limiter = None
+        self.started = False
+        self.run = {}
+
+    def _start(self):
+        # an old checkpoint is only discarded once training actually begins
+        if not self.started and self.checkpoint_dir and not self.resume:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self.started = True
+
+    @property
+    def monitor(self) -> str:
+        return 'val_loss' if self.validation_split > 0 else 'loss'
+
+    def split(self, dataset:Dataset, epochs:int) -> tuple:
+        # validation texts are kept with the checkpoints by content, so a resumed run never trains on them
+        self._start()
+        digests = dataset.text_digests()
+        self.run = {'dataset': hashlib.blake2b(np.sort(digests).tobytes(), digest_size=16).hexdigest(), 'epochs': epochs}
+        state = self._check_resume()
+        if self.validation_split <= 0:
+            return dataset, None
+        rows = dataset.rows()
+        split_path = os.path.join(self.checkpoint_dir, SPLIT_FILE) if self.checkpoint_dir else None
+        if state is not None and os.path.isfile(split_path):
+            validation = np.isin(digests, np.load(split_path))
+        else:
+            # duplicates of a validation text are held out with it, as they would be when resuming
+            validation = np.isin(digests, digests[permutation(len(rows))[:int(self.validation_split * len(rows))]])
+            if split_path:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                np.save(split_path, np.unique(digests[validation]))
+        return (
+            dataset.view(rows[~validation], shuffle=True, name=dataset.name + " (train)"),
+            dataset.view(np.sort(rows[validation]), name=dataset.name + " (validation)"),
+        )
+
+    def _check_resume(self):
+        state = read_state(self.checkpoint_dir) if self.checkpoint_dir else None
+        if state is not None:
+            for key, value in self.run.items():
+                if state.get(key) != value:
+                    raise ValueError(f"checkpoint in {self.checkpoint_dir} was made with a different training set or number of epochs, restart to discard it")
+        return state
+
+    def callbacks(self, model:keras.Model) -> list:
+        self._start()
+        callbacks = []
+        state = read_state(self.checkpoint_dir) if self.checkpoint_dir else None
+
+        if self.patience:
+            resume_state = None
+            if state is not None and 'early_stopping' in state:
+                resume_state = dict(state['early_stopping'])
+                best_path = os.path.join(self.checkpoint_dir, BEST_WEIGHTS_FILE)
+                if os.path.isfile(best_path):
+                    with np.load(best_path) as best:
+                        resume_state['best_weights'] = [best[f'arr_{i}'] for i in range(len(best.files))]
+            self.early_stopping = EarlyStopping(resume_state, monitor=self.monitor, patience=self.patience, min_delta=self.min_delta, verbose=1)
+            callbacks.append(self.early_stopping)
+
+        if self.time_limit:
+            self.time_limiter = TimeLimit(self.time_limit)
+            callbacks.append(self.time_limiter)
+
+        if self.checkpoint_dir:
+            # after early stopping and the time limit, so the saved state includes their decisions
+            checkpoints = Checkpoints(self.checkpoint_dir, self.checkpoint_every, early_stopping=self.early_stopping, run=self.run)
+            state = checkpoints.restore(model)
+            if state is not None:
+                self.initial_epoch = state['epoch']
+                # a run that already stopped early is not trained further
+                self.finished = state.get('early_stopping', {}).get('stopped_epoch', 0) > 0
+            callbacks.append(checkpoints)
+        return callbacks
+
+    def summary(self) -> dict:
+        summary = {'initial_epoch': self.initial_epoch, 'timed_out': bool(self.time_limiter and self.time_limiter.timed_out)}
+        if self.early_stopping is not None:
+            summary['stopped_epoch'] = self.early_stopping.stopped_epoch + 1 if self.early_stopping.stopped_epoch else None
+            summary['best_epoch'] = self.early_stopping.best_epoch + 1
+            summary['best'] = float(self.early_stopping.best)
+        return summary
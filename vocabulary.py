@@ -0,0 +1,88 @@
+from collections import Counter
+import hashlib
+import multiprocessing
+import os
+import numpy as np
+
+import constants
+
+PADDING_ID = 0
+OOV_ID = 1
+RESERVED_TOKENS = ['', '[UNK]']
+SHARD_SIZE = 20000
+
+def count_tokens(texts:list) -> Counter:
+    return Counter(" ".join(texts).split())
+
+def corpus_fingerprint(texts:list) -> str:
+    # datasets are reshuffled on every load and token counts do not depend on order, so neither does the key
+    digests = sorted(hashlib.blake2b(text.encode('utf8', 'surrogatepass'), digest_size=8).digest() for text in texts)
+    return hashlib.blake2b(b''.join(digests), digest_size=16).hexdigest()
+
+def cache_path(fingerprint:str) -> str:
+    return os.path.join(constants.CACHE_DIR, 'vocabularies', f'{fingerprint}.tsv')
+
+def token_counts(texts:list, workers:int=1) -> list:
+    shards = [texts[start:start+SHARD_SIZE] for start in range(0, len(texts), SHARD_SIZE)]
+    if workers > 1 and len(shards) > 1:
+        # spawned, not forked: the GUI process already runs Qt, TensorFlow and pool threads
+        with multiprocessing.get_context('spawn').Pool(min(workers, len(shards))) as pool:
+            counters = pool.map(count_tokens, shards)
+    else:
+        counters = [count_tokens(shard) for shard in shards]
+
+    counts = Counter()
+    for counter in counters:
+        counts.update(counter)
+    # same order as TextVectorization.adapt: by frequency, ties by token, both descending
+    return sorted(counts.items(), key=lambda item: (item[1], item[0].encode('utf8', 'surrogatepass')), reverse=True)
+
+def cached_token_counts(texts:list, workers:int=1) -> list:
+    path = cache_path(corpus_fingerprint(texts))
+    if os.path.isfile(path):
+        with open(path, encoding='utf8', newline='') as counts_file:
+            return [(token, int(count)) for count, token in (line[:-1].split('\t', 1) for line in counts_file)]
+
+    counts = token_counts(texts, workers)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, mode='w', encoding='utf8', newline='') as counts_file:
+        counts_file.write(''.join(f'{count}\t{token}\n' for token, count in counts))
+    os.replace(tmp_path, path)
+    return counts
+
+class Vocabulary:
+    def __init__(self, tokens:list):
+        self.tokens = tokens
+        self.index = {token: i for i, token in enumerate(tokens)}
+
+    @classmethod
+    def build(cls, texts:list, max_tokens:int=None, min_frequency:int=1, workers:int=1, cache=True):
+        counts = cached_token_counts(texts, workers) if cache else token_counts(texts, workers)
+        tokens = [token for token, count in counts if count >= min_frequency]
+        if max_tokens is not None:
+            tokens = tokens[:max(max_tokens - len(RESERVED_TOKENS), 0)]
+        return cls(RESERVED_TOKENS + tokens)
+
+    @classmethod
+    def load(cls, path:str):
+        with open(path, encoding='utf8', newline='') as vocab_file:
+            return cls(vocab_file.read().split('\n')[:-1])
+
+    def save(self, path:str):
+        with open(path, mode='w', encoding='utf8', newline='') as vocab_file:
+            vocab_file.write(''.join(token + '\n' for token in self.tokens))
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def token_ids(self, text:str) -> list:
+        index = self.index
+        return [index.get(token, OOV_ID) for token in text.split()]
+
+    def encode(self, texts:list, sequence_length:int) -> np.ndarray:
+        sequences = np.full((len(texts), sequence_length), PADDING_ID, dtype=np.int64)
+        for i, text in enumerate(texts):
+            ids = self.token_ids(text)[:sequence_length]
+            sequences[i, :len(ids)] = ids
+        return sequences
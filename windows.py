@@ -0,0 +1,43 @@
+import numpy as np
+
+from vocabulary import PADDING_ID
+
+AGGREGATIONS = ('max', 'mean', 'weighted')
+
+def window_starts(n_tokens:int, window:int, stride:int) -> list:
+    if n_tokens <= window:
+        return [0]
+    # the last window is aligned on the end of the document so every token is scored
+    starts = list(range(0, n_tokens - window, stride))
+    starts.append(n_tokens - window)
+    return starts
+
+def split_windows(token_ids:list, window:int, stride:int) -> tuple:
+    windows = []
+    documents = []
+    for document, ids in enumerate(token_ids):
+        for start in window_starts(len(ids), window, stride):
+            windows.append(ids[start:start+window])
+            documents.append(document)
+    return windows, np.array(documents, dtype=np.int64)
+
+def pad_windows(windows:list, length:int=None) -> np.ndarray:
+    # without a fixed length the batch is padded to its longest window
+    length = length or max(max(len(ids) for ids in windows), 1)
+    batch = np.full((len(windows), length), PADDING_ID, dtype=np.int64)
+    for i, ids in enumerate(windows):
+        batch[i, :len(ids)] = ids
+    return batch
+
+def aggregate(scores:np.ndarray, documents:np.ndarray, lengths:np.ndarray, n_documents:int, method:str='max') -> np.ndarray:
+    if method == 'max':
+        combined = np.full((n_documents,), -np.inf)
+        np.maximum.at(combined, documents, scores)
+    elif method == 'mean':
+        combined = np.bincount(documents, scores, n_documents) / np.bincount(documents, minlength=n_documents)
+    elif method == 'weighted':
+        weights = np.maximum(lengths, 1)
+        combined = np.bincount(documents, scores * weights, n_documents) / np.bincount(documents, weights, n_documents)
+    else:
+        raise ValueError(f"unknown aggregation '{method}', expected one of {', '.join(AGGREGATIONS)}")
+    return combined.astype(np.float32)